@@ -9,6 +9,8 @@ from pyglet.window import key
 
 import string
 
+import timing
+
 def sign(x):
     if x < 0:
         return -1
@@ -20,7 +22,8 @@ def sign(x):
 def set_menu_style(**kwargs):
     '''Updates the dictionary that determines the visual style of menus.
     Keyword aruments are used to specify values. If a value is ommitted its
-    value in the default style is used instead.
+    value in the default style is used instead. bg_image can be a function
+    returning the image, so that it isn't loaded until a menu is shown.
     '''
     global MENU_STYLE
     MENU_STYLE = DEFAULT_MENU_STYLE.copy()
@@ -69,7 +72,19 @@ class PageException(Exception):
 class Page(object):
     '''Represents any visual section of an application. Used for organizing
     application state.
+    
+    Pages that set cacheable are kept after they are popped, if the
+    application has a page cache, and pushed again instead of building a new
+    instance. They are reset before being reused.
+    
+    Pages that set idle only change when they get an event, so the
+    application stops redrawing them until they do or until they call
+    invalidate.
     '''
+    
+    cacheable = False
+    idle = False
+    
     def __init__(self, app):
         self.app = app
         self.batch = pyglet.graphics.Batch()
@@ -90,9 +105,80 @@ class Page(object):
         '''Called when this page is popped off the stack.'''
         pass
         
+    def reset(self):
+        '''Called when a cached page is taken out of the cache to be pushed
+        again, before on_focus. Should put back whatever state a new page
+        would start with.
+        '''
+        pass
+        
+    def invalidate(self):
+        '''Makes the application draw the next frame even if the page is
+        idle.
+        '''
+        self.app.invalidate()
+        
     def draw(self):
         glLoadIdentity()
         self.batch.draw()
+        
+class BoundLabel(object):
+    '''Shows the value returned by getter in label, formatted by template.
+    The text, and so the layout of the label, is only changed when the value
+    changes.
+    '''
+    
+    def __init__(self, label, template, getter):
+        self.label = label
+        self.template = template
+        self.getter = getter
+        self.value = None
+        self.bound = False
+        self.refresh()
+        
+    def refresh(self):
+        '''Updates the label if the value changed. Returns True if it did.'''
+        value = self.getter()
+        if self.bound and value == self.value:
+            return False
+        self.value = value
+        self.bound = True
+        self.label.text = self.template.format(value)
+        return True
+
+class TimingOverlay(Page):
+    '''Shows the timing statistics collected by the timing module. Meant to
+    be set as the overlay of an application so it's drawn over every page.
+    '''
+    
+    REFRESH = 0.5
+    ROW = '{name:<20} {p50:7.2f} {p95:7.2f} {p99:7.2f} {max:7.2f}'
+    
+    def __init__(self, app):
+        super(TimingOverlay, self).__init__(app)
+        self.label = Label(font_name='Courier', font_size=10,
+                           color=(255, 255, 255, 255), multiline=True,
+                           width=app.width, x=10, y=app.height - 10,
+                           anchor_y='top', batch=self.batch)
+        self.last_refresh = 0
+        
+    def refresh(self):
+        lines = ['{0:<20} {1:>7} {2:>7} {3:>7} {4:>7}'.format(
+            'ms', 'p50', 'p95', 'p99', 'max')]
+        for row in timing.report():
+            lines.append(self.ROW.format(**row))
+        self.label.text = '\n'.join(lines)
+        
+    def draw(self):
+        now = timing.clock()
+        if now - self.last_refresh > self.REFRESH:
+            self.last_refresh = now
+            self.refresh()
+        glLoadIdentity()
+        glColor4f(0.0, 0.0, 0.0, 0.6)
+        glRectf(0, self.app.height, self.app.width,
+                self.app.height - self.label.content_height - 20)
+        self.batch.draw()
 
 class MenuException(Exception):
     '''Raised when a menu performs an illegal operation.'''
@@ -118,6 +204,10 @@ class MenuItem(object):
         '''Called when a key release occurrs while this item is selected.'''
         pass
         
+    def reset(self):
+        '''Called when the menu is reused from the page cache.'''
+        pass
+        
 class TitleItem(MenuItem):
     def __init__(self, name, menu):
         super(TitleItem, self).__init__(name, menu, selectable=False)
@@ -185,6 +275,10 @@ class TextItem(MenuItem):
                 self.text = self.text[:-1]
                 self.update_label()
             
+    def reset(self):
+        self.text = ''
+        self.update_label()
+            
     def update_label(self, cursor=True):
         text = '{0}: {1}'.format(self.name, self.text)
         if cursor:
@@ -196,14 +290,19 @@ class Menu(Page):
     and interacted with.
     '''
     
+    idle = True
+    
     def __init__(self, app):
         super(Menu, self).__init__(app)
         self.items = []
         self.selection = 0
         self.cur_item = None
         
-        if MENU_STYLE['bg_image']:
-            self.bg_image = Sprite(MENU_STYLE['bg_image'], batch=self.batch)
+        bg_image = MENU_STYLE['bg_image']
+        if callable(bg_image):
+            bg_image = bg_image()
+        if bg_image:
+            self.bg_image = Sprite(bg_image, batch=self.batch)
         
     def set_items(self, *items):
         self.items = items
@@ -229,6 +328,10 @@ class Menu(Page):
         self.selection = i
         self.cur_item = self.items[i]
         
+    def reset(self):
+        for item in self.items:
+            item.reset()
+        
     def on_focus(self):
         for i, item in enumerate(self.items):
             if item.selectable:
@@ -267,6 +370,12 @@ class Application(pyglet.window.Window):
         super(Application, self).__init__(width, height, **kwargs)
         self.pages = {}
         self.page_stack = []
+        self.overlay = None
+        self.startup_time = None
+        self.page_cache = []
+        self.page_cache_size = 0
+        self.dirty = True
+        self.drawn = False
         
     def add_page(self, page):
         '''Takes a class that subclasses Page and adds it to the dictionary of
@@ -291,10 +400,13 @@ class Application(pyglet.window.Window):
             self.page_stack[-1].on_unfocus()
             self.pop_handlers()
         
-        new_page = self.pages[name](self)
+        new_page = self.take_cached_page(name)
+        if new_page is None:
+            new_page = self.pages[name](self)
         new_page.on_focus()
         self.page_stack.append(new_page)
         self.push_handlers(new_page)
+        self.invalidate()
         
     def pop_page(self, target=None):
         '''Discards the top page and removes its event listeners. Pushes the
@@ -309,21 +421,104 @@ class Application(pyglet.window.Window):
         self.page_stack[-1].on_unfocus()
         self.page_stack[-1].on_destroy()
         self.pop_handlers()
-        self.page_stack.pop()
+        self.cache_page(self.page_stack.pop())
         
         if len(self.page_stack) > 0:
             self.page_stack[-1].on_focus()
             self.push_handlers(self.page_stack[-1])
         else:
             self.close()
+        self.invalidate()
             
         if target != None:
             if self.page_stack[-1].__class__.__name__ != target:
                 self.pop_page(target)
         
+    def set_page_cache(self, size):
+        '''Keeps up to size popped pages whose class is cacheable for reuse,
+        dropping the least recently popped ones first. 0 turns the cache off.
+        '''
+        self.page_cache_size = size
+        del self.page_cache[:max(len(self.page_cache) - size, 0)]
+        
+    def cache_page(self, page):
+        if page.cacheable and self.page_cache_size > 0:
+            self.page_cache.append(page)
+            if len(self.page_cache) > self.page_cache_size:
+                self.page_cache.pop(0)
+            
+    def take_cached_page(self, name):
+        for i in range(len(self.page_cache) - 1, -1, -1):
+            page = self.page_cache[i]
+            if page.__class__ is self.pages[name]:
+                del self.page_cache[i]
+                page.reset()
+                return page
+        return None
+        
+    def set_overlay(self, overlay):
+        '''Sets a page that is drawn on top of the current page every frame.
+        It receives no events. Pass None to remove it.
+        '''
+        self.overlay = overlay
+        self.invalidate()
+        
+    def toggle_timing(self):
+        '''Turns timing on and shows a TimingOverlay, or hides the overlay
+        and puts timing back the way it was.
+        '''
+        if self.overlay is None:
+            self.timing_was_enabled = timing.ENABLED
+            timing.enable()
+            self.set_overlay(TimingOverlay(self))
+        else:
+            timing.enable(self.timing_was_enabled)
+            self.set_overlay(None)
+        
+    def invalidate(self):
+        '''Makes sure the next frame is drawn.'''
+        self.dirty = True
+        
+    def on_key_press(self, symbol, modifiers):
+        # Pages handle keys first; whatever they did has to be drawn
+        self.invalidate()
+        super(Application, self).on_key_press(symbol, modifiers)
+        
+    def on_key_release(self, symbol, modifiers):
+        self.invalidate()
+        
+    def on_resize(self, width, height):
+        self.invalidate()
+        super(Application, self).on_resize(width, height)
+        
+    def on_expose(self):
+        self.invalidate()
+        
     def on_draw(self):
+        # An idle page that hasn't changed is left on the screen as it is,
+        # without clearing, drawing or flipping
+        page = self.page_stack[-1] if self.page_stack else None
+        if (page is not None and page.idle and not self.dirty and
+                self.overlay is None):
+            self.drawn = False
+            return
+        self.dirty = False
+        self.drawn = True
+        self.draw_frame()
+        
+    def flip(self):
+        if self.drawn:
+            super(Application, self).flip()
+        
+    @timing.timed('frame')
+    def draw_frame(self):
         self.clear()
         if len(self.page_stack) > 0:
             self.page_stack[-1].draw()
+        if self.overlay:
+            self.overlay.draw()
+        if self.startup_time is None:
+            self.startup_time = timing.since_start()
+            timing.record('startup', self.startup_time)
             
 
@@ -0,0 +1,78 @@
+import os
+
+from timing import timed
+
+RES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'res')
+
+class AssetException(Exception):
+    '''Raised when a resource can't be found.'''
+    pass
+
+class Assets(object):
+    '''Loads the resources in a directory the first time they are asked for
+    and keeps them. pyglet.image is only imported then too, since importing
+    it opens a GL context.
+
+    Textures are packed into shared atlas textures of atlas_size squared
+    pixels as they are first used, so that images drawn together don't
+    switch textures. Images too big for the atlas, or every image if
+    atlas_size is None, get a texture of their own.
+    '''
+
+    def __init__(self, directory=RES_DIR, atlas_size=2048):
+        self.directory = directory
+        self.atlas_size = atlas_size
+        self.images = {}
+        self.textures = {}
+        self.atlas = None
+
+    def path(self, name):
+        path = os.path.join(self.directory, name)
+        if not os.path.isfile(path):
+            raise AssetException('No such resource "{0}"'.format(name))
+        return path
+
+    def image(self, name):
+        '''Returns the decoded image in the resource called name.'''
+        image = self.images.get(name)
+        if image is None:
+            image = self.images[name] = self.load(name)
+        return image
+
+    @timed('assets.load')
+    def load(self, name):
+        path = self.path(name)
+        import pyglet.image
+        return pyglet.image.load(path)
+
+    def texture(self, name):
+        '''Returns the texture of the image called name.'''
+        texture = self.textures.get(name)
+        if texture is None:
+            texture = self.textures[name] = self.upload(self.image(name))
+        return texture
+
+    @timed('assets.upload')
+    def upload(self, image):
+        if self.atlas_size is None:
+            return image.get_texture()
+
+        import pyglet.image.atlas
+        if self.atlas is None:
+            self.atlas = pyglet.image.atlas.TextureBin(self.atlas_size,
+                                                       self.atlas_size)
+        try:
+            return self.atlas.add(image)
+        except pyglet.image.atlas.AllocatorException:
+            return image.get_texture()
+
+    def preload(self, *names):
+        '''Loads and uploads the given resources now.'''
+        for name in names:
+            self.texture(name)
+
+    def lazy_texture(self, name):
+        '''Returns a function that returns the texture called name, for
+        settings that are made before there is a window to load it in.
+        '''
+        return lambda: self.texture(name)
@@ -0,0 +1,247 @@
+import numpy as np
+
+from blockstuff import *
+
+# Shape tables as arrays indexed by [shape, rotation]. Every shape has four
+# rotations of four squares each.
+OFFSETS = np.array([shape.offsets for shape in BLOCKS], dtype=np.int64)
+WIDTHS = np.array([[w for w, h in shape.bounds] for shape in BLOCKS],
+                  dtype=np.int64)
+HEIGHTS = np.array([[h for w, h in shape.bounds] for shape in BLOCKS],
+                   dtype=np.int64)
+ROTATIONS = OFFSETS.shape[1]
+
+class BatchField(object):
+    '''Runs n independent games at once. Boards are stored as one
+    (n, h, w) array holding 0 for empty squares and shape index + 1 for
+    filled ones; the falling blocks are described by parallel arrays of
+    shape, rotation, x and y.
+
+    Every operation takes an optional boolean mask selecting the boards it
+    applies to and follows the rules of the BlockField method of the same
+    name. Boards that are over are never changed.
+    '''
+
+    def __init__(self, n, w, h, seed=None, queue_len=BlockField.QUEUE_LEN):
+        self.n = n
+        self.w = w
+        self.h = h
+        self.random = np.random.RandomState(seed)
+        self.index = np.arange(n)
+
+        self.boards = np.zeros((n, h, w), dtype=np.uint8)
+        self.shape = np.zeros(n, dtype=np.int64)
+        self.rotation = np.zeros(n, dtype=np.int64)
+        self.x = np.zeros(n, dtype=np.int64)
+        self.y = np.zeros(n, dtype=np.int64)
+        self.queue = self.random.randint(len(BLOCKS), size=(n, queue_len))
+
+        self.lines = np.zeros(n, dtype=np.int64)
+        self.pieces = np.zeros(n, dtype=np.int64)
+        self.level = np.ones(n, dtype=np.int64)
+        self.next_level = np.full(n, BlockField.LEVEL_INTERVAL, dtype=np.int64)
+        self.points = np.zeros(n, dtype=np.int64)
+        self.state = np.full(n, BlockField.PLAY, dtype=np.int8)
+
+        self.last_update = np.zeros(n, dtype=np.float64)
+        self.speed = np.full(n, BlockField.MIN_SPEED, dtype=np.int64)
+
+        self.spawn(self.index)
+
+    def select(self, which=None):
+        '''Returns the indices of the boards that are still being played,
+        restricted to the boolean mask which if one is given.
+        '''
+        active = self.state == BlockField.PLAY
+        if which is not None:
+            active &= which
+        return np.flatnonzero(active)
+
+    def collision(self, idx, rotation, x, y):
+        '''Collision flags, as returned by BlockDump.collision, for the
+        boards idx if their blocks had the given rotation and position.
+        '''
+        shape = self.shape[idx]
+        res = np.zeros(len(idx), dtype=np.int64)
+
+        res[(x < 0) | (x + WIDTHS[shape, rotation] > self.w)] |= \
+            BlockDump.SIDE_COL
+        res[y + HEIGHTS[shape, rotation] > self.h] |= BlockDump.BOTTOM_COL
+
+        cells = OFFSETS[shape, rotation]
+        cx = x[:, None] + cells[..., 0]
+        cy = y[:, None] + cells[..., 1]
+        inside = (cx >= 0) & (cx < self.w) & (cy >= 0) & (cy < self.h)
+        filled = self.boards[idx[:, None],
+                             np.clip(cy, 0, self.h - 1),
+                             np.clip(cx, 0, self.w - 1)] != 0
+        res[(filled & inside).any(axis=1)] |= BlockDump.BLOCK_COL
+        return res
+
+    def spawn(self, idx):
+        shape = self.queue[idx, 0]
+        self.queue[idx, :-1] = self.queue[idx, 1:]
+        self.queue[idx, -1] = self.random.randint(len(BLOCKS), size=len(idx))
+
+        self.shape[idx] = shape
+        self.rotation[idx] = 0
+        self.x[idx] = self.w // 2 - WIDTHS[shape, 0] // 2
+        self.y[idx] = -HEIGHTS[shape, 0]
+
+    def move(self, drc, which=None):
+        idx = self.select(which)
+        x = self.x[idx] + drc
+        ok = self.collision(idx, self.rotation[idx], x, self.y[idx]) == 0
+        self.x[idx[ok]] = x[ok]
+
+    def rotate(self, drc, which=None):
+        idx = self.select(which)
+        rotation = (self.rotation[idx] + drc) % ROTATIONS
+        x = self.x[idx]
+        y = self.y[idx]
+        shape = self.shape[idx]
+        col = self.collision(idx, rotation, x, y)
+
+        SIDE = BlockDump.SIDE_COL
+        BLOCK = BlockDump.BLOCK_COL
+        BOTTOM = BlockDump.BOTTOM_COL
+        accept = col == BlockDump.NO_COL
+        new_x = x.copy()
+        new_y = y.copy()
+        rest = col != SIDE | BLOCK
+
+        # Pushed back from the right wall
+        side = rest & (col & SIDE != 0)
+        kick_x = self.w - WIDTHS[shape, rotation]
+        ok = side & (self.collision(idx, rotation, kick_x, y) == 0)
+        new_x[ok] = kick_x[ok]
+        accept |= ok
+        rest &= ~side
+
+        # Nudged one column to the right, or failing that to the left
+        block = rest & (col & BLOCK != 0)
+        ok_right = block & (self.collision(idx, rotation, x + 1, y) == 0)
+        ok_left = block & ~ok_right & \
+            (self.collision(idx, rotation, x - 1, y) == 0)
+        new_x[ok_right] += 1
+        new_x[ok_left] -= 1
+        accept |= ok_right | ok_left
+        rest &= ~block
+
+        # Lifted off the floor
+        bottom = rest & (col & BOTTOM != 0)
+        kick_y = self.h - HEIGHTS[shape, rotation]
+        ok = bottom & (self.collision(idx, rotation, x, kick_y) == 0)
+        new_y[ok] = kick_y[ok]
+        accept |= ok
+
+        idx = idx[accept]
+        self.rotation[idx] = rotation[accept]
+        self.x[idx] = new_x[accept]
+        self.y[idx] = new_y[accept]
+
+    def fall(self, which=None):
+        '''Moves the selected blocks down one row, locking those that can't
+        move. Returns the indices of the boards whose block was locked.
+        '''
+        idx = self.select(which)
+        y = self.y[idx] + 1
+        col = self.collision(idx, self.rotation[idx], self.x[idx], y)
+        landed = col & (BlockDump.BLOCK_COL | BlockDump.BOTTOM_COL) != 0
+        self.y[idx[~landed]] = y[~landed]
+
+        idx = idx[landed]
+        if len(idx):
+            self.lock(idx)
+        return idx
+
+    def lock(self, idx):
+        shape = self.shape[idx]
+        cells = OFFSETS[shape, self.rotation[idx]]
+        cx = (self.x[idx][:, None] + cells[..., 0]).ravel()
+        cy = (self.y[idx][:, None] + cells[..., 1]).ravel()
+        board = np.repeat(idx, cells.shape[1])
+        color = np.repeat(shape + 1, cells.shape[1])
+        inside = (cx >= 0) & (cx < self.w) & (cy >= 0) & (cy < self.h)
+        self.boards[board[inside], cy[inside], cx[inside]] = color[inside]
+        self.pieces[idx] += 1
+
+        self.state[idx[self.y[idx] < 0]] = BlockField.OVER
+        lines = self.clear_lines(idx)
+        self.lines[idx] += lines
+        self.points[idx] += self.level[idx] * lines**2
+        self.spawn(idx)
+
+    def clear_lines(self, idx):
+        '''Removes the full rows of the boards idx. Returns the number of rows
+        cleared on each board.
+        '''
+        boards = self.boards[idx]
+        full = (boards != 0).all(axis=2)
+        lines = full.sum(axis=1)
+        hit = lines > 0
+        if not hit.any():
+            return lines
+
+        boards = boards[hit]
+        # A stable sort of "kept" moves the full rows to the top and keeps
+        # the order of the remaining rows; the full rows are then emptied.
+        order = np.argsort(~full[hit], axis=1, kind='mergesort')
+        boards = boards[np.arange(len(boards))[:, None], order]
+        boards[np.arange(self.h) < lines[hit][:, None]] = 0
+        self.boards[idx[hit]] = boards
+        return lines
+
+    def tick(self, which=None):
+        idx = self.select(which)
+        selected = np.zeros(self.n, dtype=bool)
+        selected[idx] = True
+        self.fall(selected)
+
+        up = idx[self.lines[idx] >= self.next_level[idx]]
+        self.level[up] += 1
+        self.speed[up] = np.minimum(self.speed[up] + BlockField.SPEED_STEP,
+                                    BlockField.MAX_SPEED)
+        self.next_level[up] += BlockField.LEVEL_INTERVAL
+
+    def update(self, dt, which=None):
+        '''Advances the gravity clocks of the selected boards by dt seconds,
+        running up to BlockField.MAX_TICKS ticks on each. Returns the number
+        of ticks every board had.
+        '''
+        idx = self.select(which)
+        self.last_update[idx] += dt
+        ticks = np.zeros(self.n, dtype=np.int64)
+        pending = np.zeros(self.n, dtype=bool)
+        pending[idx] = True
+        while True:
+            pending &= self.state == BlockField.PLAY
+            interval = 1.0 / self.speed
+            due = pending & (self.last_update > interval)
+            if not due.any():
+                return ticks
+            capped = due & (ticks == BlockField.MAX_TICKS)
+            self.last_update[capped] = 0.0
+            pending &= ~capped
+            due &= ~capped
+            self.last_update[due] -= interval[due]
+            self.tick(due)
+            ticks[due] += 1
+
+    def drop(self, which=None):
+        idx = self.select(which)
+        falls = np.zeros(self.n, dtype=np.int64)
+        falling = np.zeros(self.n, dtype=bool)
+        falling[idx] = True
+        while falling.any():
+            falls[falling] += 1
+            landed = self.fall(falling)
+            falling[landed] = False
+        self.points[idx] += falls[idx] // (self.h // 3)
+
+    def dump(self, i):
+        '''Returns board i as a BlockDump coloured like a BlockField.'''
+        dump = BlockDump(self.w, self.h)
+        for r, c in zip(*np.nonzero(self.boards[i])):
+            dump[r, c] = COLORS[self.boards[i, r, c] - 1]
+        return dump
@@ -0,0 +1,119 @@
+import json
+import platform
+import random
+import subprocess
+import sys, os
+import time
+import timeit
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from blockstuff import *
+
+SEED = 1234
+FILLS = (0.0, 0.25, 0.5, 0.75)
+
+def filled_dump(w, h, fill, seed=SEED):
+    '''A board whose bottom fill * h rows are mostly filled, with at least
+    one hole per row so that no row is full.
+    '''
+    rng = random.Random(seed)
+    dump = BlockDump(w, h)
+    for r in range(h - int(round(fill * h)), h):
+        for c in range(w):
+            if rng.random() < 0.8:
+                dump[r, c] = rng.choice(COLORS)
+        dump[r, rng.randrange(w)] = 0
+    return dump
+
+def all_blocks():
+    '''Every shape in every rotation.'''
+    blocks = []
+    for shape, color in zip(BLOCKS, COLORS):
+        for rotation in range(len(shape.rotations)):
+            block = Block(shape, color)
+            block.set_rotation(rotation)
+            blocks.append(block)
+    return blocks
+
+def best_time(func, number, repeat=5):
+    '''Seconds per call of func, the best of repeat runs of number calls.'''
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+def best_batch_time(setup, func, repeat=5):
+    '''Seconds per item for operations that consume their input: setup
+    returns a fresh list of items and func is timed over all of them.
+    '''
+    times = []
+    for i in range(repeat):
+        items = setup()
+        start = timeit.default_timer()
+        func(items)
+        times.append((timeit.default_timer() - start) / len(items))
+    return min(times)
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'],
+                                       cwd=ROOT).strip().decode('ascii')
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save(path, results):
+    '''Writes results, a dictionary of name -> value, to path as JSON along
+    with a description of the machine and commit they were measured on.
+    '''
+    data = {
+        'commit': git_commit(),
+        'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.platform(),
+        'results': results,
+    }
+    out = open(path, 'w')
+    json.dump(data, out, indent=2, sort_keys=True)
+    out.close()
+
+def load(path):
+    bench_file = open(path, 'r')
+    data = json.load(bench_file)
+    bench_file.close()
+    return data
+
+def compare(old, new, threshold, higher_is_better=()):
+    '''Compares two saved result files. Returns a list of (name, old, new,
+    change) rows and the names that got worse by more than threshold
+    percent. Values are times unless their name is in higher_is_better.
+    '''
+    rows = []
+    regressions = []
+    old_results = old['results']
+    new_results = new['results']
+    for name in sorted(set(old_results) & set(new_results)):
+        before = old_results[name]
+        after = new_results[name]
+        if not before:
+            continue
+        change = 100.0 * (after - before) / before
+        rows.append((name, before, after, change))
+        worse = -change if name in higher_is_better else change
+        if worse > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+def print_comparison(old_path, new_path, threshold, higher_is_better=()):
+    '''Prints a comparison table and returns the exit status for it.'''
+    old = load(old_path)
+    new = load(new_path)
+    rows, regressions = compare(old, new, threshold, higher_is_better)
+    print('{0} ({1}) -> {2} ({3})'.format(
+        old_path, old['commit'], new_path, new['commit']))
+    for name, before, after, change in rows:
+        mark = ' <-- regression' if name in regressions else ''
+        print('{0:<40} {1:>12.3f} {2:>12.3f} {3:>+8.1f}%{4}'.format(
+            name, before, after, change, mark))
+    if regressions:
+        print('{0} regression(s) over {1}%'.format(len(regressions), threshold))
+        return 1
+    return 0
@@ -0,0 +1,163 @@
+#!/usr/bin/env python
+'''End-to-end throughput benchmark over a corpus of recorded games.
+
+    python bench/macro.py --generate 20 corpus/
+    python bench/macro.py corpus/ -o before.json
+    python bench/macro.py corpus/ --render -o before-render.json
+    python bench/macro.py --compare before.json after.json
+
+The headless mode replays every game through BlockField and reports pieces
+and cleared lines per second and the peak memory of the process. The render
+mode also draws the field into a hidden pyglet window after every record and
+reports frames per second.
+'''
+import argparse
+import glob
+import random
+import resource
+import sys, os
+import timeit
+
+from benchutil import *
+from engine import *
+from replay import ReplayWriter, read_records, start_replay, apply_record
+from search import placements
+
+HIGHER_IS_BETTER = ('pieces_per_sec', 'lines_per_sec', 'records_per_sec',
+                    'frames_per_sec')
+
+def corpus_bot(field, rng):
+    '''Picks the lowest reachable placement, breaking ties randomly.'''
+    found = placements(field.dump, field.block)
+    if not found:
+        return None
+    return max(found, key=lambda p: (p[1], rng.random()))[3]
+
+def generate(count, directory, seed=SEED):
+    '''Records count bot games into directory, with gravity running between
+    inputs so the corpus mixes moves, rotations, falls, drops and ticks.
+    '''
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    rng = random.Random(seed)
+    for game in range(count):
+        path = os.path.join(directory, 'game{0:04d}.rpl'.format(game))
+        engine = Engine(10, 20, seed=seed + game)
+        engine.recorder = ReplayWriter(path, engine.field)
+        while not engine.is_over() and engine.field.pieces < 1000:
+            actions = corpus_bot(engine.field, rng)
+            if actions is None:
+                break
+            block = engine.field.block
+            for action in actions:
+                engine.apply(action)
+                engine.update(0.02)
+                if engine.field.block is not block:
+                    break
+            else:
+                engine.apply(DROP if rng.random() < 0.7 else FALL)
+            engine.update(0.02)
+        engine.recorder.close()
+
+def load_corpus(directory):
+    paths = sorted(glob.glob(os.path.join(directory, '*.rpl')))
+    if not paths:
+        raise SystemExit('No replays in {0}'.format(directory))
+    return [list(read_records(path)) for path in paths]
+
+def peak_memory_kb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak /= 1024
+    return peak
+
+def run_headless(corpus, repeat=3):
+    best = None
+    for i in range(repeat):
+        pieces = lines = records = 0
+        start = timeit.default_timer()
+        for game in corpus:
+            game = iter(game)
+            engine = start_replay(game)
+            for kind, time, fields in game:
+                apply_record(engine, kind, time, fields)
+                records += 1
+            pieces += engine.field.pieces
+            lines += engine.field.lines
+        elapsed = timeit.default_timer() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return {
+        'games': len(corpus),
+        'pieces_per_sec': pieces / best,
+        'lines_per_sec': lines / best,
+        'records_per_sec': records / best,
+        'peak_memory_kb': peak_memory_kb(),
+    }
+
+def run_render(corpus):
+    import pyglet
+    from pyglet.gl import glScalef, glTranslatef, glLoadIdentity, glFinish
+    from drawing import draw_block_field, DumpRenderer
+
+    size = 20
+    window = pyglet.window.Window(20 * size, 22 * size, visible=False)
+    frames = 0
+    start = timeit.default_timer()
+    for game in corpus:
+        game = iter(game)
+        engine = start_replay(game)
+        renderer = DumpRenderer(engine.field.dump)
+        for kind, time, fields in game:
+            apply_record(engine, kind, time, fields)
+            window.switch_to()
+            window.clear()
+            glLoadIdentity()
+            glScalef(size, size, 1.0)
+            glTranslatef(1, 1, 0)
+            draw_block_field(engine.field, renderer)
+            glFinish()
+            frames += 1
+    elapsed = timeit.default_timer() - start
+    window.close()
+    return {
+        'frames_per_sec': frames / elapsed,
+        'peak_memory_kb': peak_memory_kb(),
+    }
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('corpus', nargs='?', help='directory of replays')
+    parser.add_argument('-o', '--output', help='write results to this file')
+    parser.add_argument('--render', action='store_true',
+                        help='draw every frame into a hidden window')
+    parser.add_argument('--generate', type=int, metavar='GAMES',
+                        help='record a corpus of bot games into CORPUS')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two result files instead of running')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent slowdown that counts as a regression')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return print_comparison(args.compare[0], args.compare[1],
+                                args.threshold, HIGHER_IS_BETTER)
+    if not args.corpus:
+        parser.error('a corpus directory is required')
+    if args.generate:
+        generate(args.generate, args.corpus)
+        return 0
+
+    corpus = load_corpus(args.corpus)
+    if args.render:
+        results = run_render(corpus)
+    else:
+        results = run_headless(corpus)
+    for name in sorted(results):
+        print('{0:<20} {1:>14.1f}'.format(name, results[name]))
+    if args.output:
+        save(args.output, results)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
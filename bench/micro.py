@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+'''Micro-benchmarks for the hot paths of geom, blockstuff, gravity and
+stream.
+
+    python bench/micro.py -o before.json
+    python bench/micro.py -o after.json
+    python bench/micro.py --compare before.json after.json --threshold 10
+
+Results are microseconds per operation; fixtures are seeded so every run
+measures the same boards and blocks.
+'''
+import argparse
+import random
+import sys
+import timeit
+
+from benchutil import *
+from engine import Engine, ACTIONS
+from gravity import GravityScheduler
+from pieces import PieceSource
+from stream import FieldEncoder, FieldDecoder
+
+W = 10
+H = 20
+
+def positioned_blocks(w, h):
+    blocks = []
+    for block in all_blocks():
+        for x in range(-1, w):
+            for y in range(-2, h, 3):
+                clone = block.clone()
+                clone.x = x
+                clone.y = y
+                blocks.append(clone)
+    return blocks
+
+def new_field(dump, seed=SEED):
+    field = BlockField(W, H, PieceSource(len(BLOCKS), seed))
+    field.dump = dump.copy()
+    return field
+
+def wanted(only, *names):
+    # Whether any of names passes the --filter, checked before timing so
+    # filtered out benchmarks cost nothing
+    return not only or any(only in name for name in names)
+
+def bench_matrix(results, scale, only=None):
+    templates = [shape.rotations[0] for shape in BLOCKS]
+
+    def rotate():
+        for matrix in templates:
+            matrix.rotate(Matrix.CW)
+            matrix.rotate(Matrix.CCW)
+    if wanted(only, 'matrix.rotate'):
+        results['matrix.rotate'] = best_time(rotate, 2000 * scale) / 14
+
+    def construct():
+        for matrix in templates:
+            Shape(matrix)
+    if wanted(only, 'shape.init'):
+        results['shape.init'] = best_time(construct, 100 * scale) / 7
+
+def bench_dump(results, scale, only=None):
+    blocks = positioned_blocks(W, H)
+    for fill in FILLS:
+        name = 'fill{0:02d}'.format(int(fill * 100))
+        if not wanted(only, *['dump.{0}.{1}'.format(op, name) for op in (
+                'collision', 'what_if', 'add_block', 'remove_filled_lines')]):
+            continue
+        dump = filled_dump(W, H, fill)
+
+        def collide():
+            collision = dump.collision
+            for block in blocks:
+                collision(block)
+        if wanted(only, 'dump.collision.' + name):
+            results['dump.collision.' + name] = \
+                best_time(collide, 20 * scale) / len(blocks)
+
+        landed = []
+        for block in all_blocks():
+            block.x = W / 2 - block.bounds[0] / 2
+            block.y = -block.bounds[1]
+            while not dump.collision(block):
+                block.y += 1
+            block.y -= 1
+            landed.append(block)
+
+        def what_if():
+            for block in landed:
+                dump.what_if(block.shape, block.rotation, block.x, block.y)
+        if wanted(only, 'dump.what_if.' + name):
+            results['dump.what_if.' + name] = \
+                best_time(what_if, 100 * scale) / len(landed)
+
+        def add_setup():
+            return [(dump.copy(), block)
+                    for block in landed for i in range(100 * scale)]
+        def add(items):
+            for target, block in items:
+                target.add_block(block)
+        if wanted(only, 'dump.add_block.' + name):
+            results['dump.add_block.' + name] = \
+                best_batch_time(add_setup, add)
+
+        full = dump.copy()
+        for r in range(H - 4, H):
+            for c in range(W):
+                full[r, c] = COLORS[0]
+        def clear_setup():
+            return [full.copy() for i in range(500 * scale)]
+        def clear(items):
+            for target in items:
+                target.remove_filled_lines()
+        if wanted(only, 'dump.remove_filled_lines.' + name):
+            results['dump.remove_filled_lines.' + name] = \
+                best_batch_time(clear_setup, clear)
+
+def bench_field(results, scale, only=None):
+    dump = filled_dump(W, H, 0.5)
+
+    field = new_field(dump)
+    for i in range(6):
+        field.fall()
+    def rotate():
+        field.rotate(BlockField.RIGHT)
+        field.rotate(BlockField.LEFT)
+    if wanted(only, 'field.rotate'):
+        results['field.rotate'] = best_time(rotate, 5000 * scale) / 2
+
+    def move():
+        field.move(BlockField.LEFT)
+        field.move(BlockField.RIGHT)
+    if wanted(only, 'field.move'):
+        results['field.move'] = best_time(move, 5000 * scale) / 2
+
+    def fields_setup():
+        return [new_field(dump, seed) for seed in range(200 * scale)]
+    def fall(fields):
+        for target in fields:
+            target.fall()
+    if wanted(only, 'field.fall'):
+        results['field.fall'] = best_batch_time(fields_setup, fall)
+
+    def drop(fields):
+        for target in fields:
+            target.drop()
+    if wanted(only, 'field.drop'):
+        results['field.drop'] = best_batch_time(fields_setup, drop)
+
+def bench_gravity(results, scale, only=None):
+    # A second of 1/60 s steps for fields spread over the speed levels,
+    # polled one by one or run from a scheduler
+    steps = 60
+    def fields_setup():
+        fields = [new_field(BlockDump(W, H), seed)
+                  for seed in range(200 * scale)]
+        for i, target in enumerate(fields):
+            target.speed = BlockField.MIN_SPEED + i % (
+                BlockField.MAX_SPEED - BlockField.MIN_SPEED + 1)
+        return fields
+    def poll(fields):
+        for step in range(steps):
+            for target in fields:
+                target.update(1.0 / steps)
+    if wanted(only, 'gravity.poll'):
+        results['gravity.poll'] = \
+            best_batch_time(fields_setup, poll) / steps
+
+    def schedule(fields):
+        scheduler = GravityScheduler()
+        for target in fields:
+            scheduler.add(target)
+        for step in range(steps):
+            scheduler.advance(1.0 / steps)
+    if wanted(only, 'gravity.scheduler'):
+        results['gravity.scheduler'] = \
+            best_batch_time(fields_setup, schedule) / steps
+
+def bench_stream(results, scale, only=None):
+    # Frames of random games, one per action, timed apart from the game.
+    # Decoding needs the frames, so the games run for either benchmark.
+    if not wanted(only, 'stream.encode', 'stream.decode'):
+        return
+    def play():
+        engine = Engine(W, H, seed=SEED)
+        rng = random.Random(SEED)
+        encoder = FieldEncoder(engine.field)
+        frames = []
+        elapsed = 0.0
+        while len(frames) < 1000 * scale:
+            if engine.is_over():
+                engine = Engine(W, H, seed=SEED + len(frames))
+                encoder = FieldEncoder(engine.field)
+            engine.apply(rng.choice(ACTIONS))
+            start = timeit.default_timer()
+            frames.append(encoder.frame())
+            elapsed += timeit.default_timer() - start
+        return elapsed / len(frames), frames
+    runs = [play() for i in range(3)]
+    if wanted(only, 'stream.encode'):
+        results['stream.encode'] = min(run[0] for run in runs)
+    frames = runs[0][1]
+
+    def decode(frames):
+        decoder = FieldDecoder()
+        for frame in frames:
+            decoder.decode(frame)
+    if wanted(only, 'stream.decode'):
+        results['stream.decode'] = best_batch_time(lambda: frames, decode)
+
+BENCHMARKS = (bench_matrix, bench_dump, bench_field, bench_gravity,
+              bench_stream)
+
+def run(scale=1, only=None):
+    results = {}
+    for bench in BENCHMARKS:
+        bench(results, scale, only)
+    return dict((name, seconds * 1e6) for name, seconds in results.items())
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-o', '--output', help='write results to this file')
+    parser.add_argument('--filter', help='only keep benchmarks matching this')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='multiply the iteration counts')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two result files instead of running')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent slowdown that counts as a regression')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return print_comparison(args.compare[0], args.compare[1],
+                                args.threshold)
+
+    results = run(args.scale, args.filter)
+    for name in sorted(results):
+        print('{0:<40} {1:>10.3f} us'.format(name, results[name]))
+    if args.output:
+        save(args.output, results)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+'''Loopback benchmark of the game server.
+
+    python bench/net.py --sessions 1000 -o before.json
+    python bench/net.py --compare before.json after.json
+
+Connects the given number of clients to a GameServer in the same process,
+has each send a random action now and then, and runs the server's gravity
+in steps of 1/60 s. Reports the server's time per update for all sessions
+and per session, the actions handled per second and the memory each
+session adds, clients included.
+'''
+import argparse
+import random
+import resource
+import sys, os
+import timeit
+
+from benchutil import *
+from server import *
+
+HIGHER_IS_BETTER = ('actions_per_sec',)
+
+STEP = 1.0 / 60
+
+def memory_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        rss /= 1024
+    return rss
+
+def raise_file_limit(needed):
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and soft < needed:
+        if hard != resource.RLIM_INFINITY:
+            needed = min(needed, hard)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (needed, hard))
+
+def run(sessions, steps, action_rate, seed=SEED):
+    raise_file_limit(2 * sessions + 64)
+    rng = random.Random(seed)
+    server = GameServer(('127.0.0.1', 0), seed=seed)
+    before = memory_kb()
+    clients = []
+    for i in range(sessions):
+        clients.append(RemoteField(server.address))
+        server.poll()
+    while len(server.sessions) < sessions:
+        server.poll(0.01)
+    for client in clients:
+        server.poll()
+        client.wait()
+    memory = memory_kb() - before
+
+    actions = 0
+    update_time = network_time = 0.0
+    for step in range(steps):
+        for client in clients:
+            if not client.is_over() and rng.random() < action_rate:
+                client.send(rng.choice(CLIENT_ACTIONS[:6]))
+                actions += 1
+        # One pass reads every client that sent something, the next sends
+        # the results back
+        start = timeit.default_timer()
+        server.poll()
+        server.poll()
+        middle = timeit.default_timer()
+        server.update(STEP)
+        end = timeit.default_timer()
+        network_time += middle - start
+        update_time += end - middle
+        for client in clients:
+            client.poll()
+
+    for client in clients:
+        client.close()
+    server.close()
+    return {
+        'update_ms': 1000.0 * update_time / steps,
+        'update_us_per_session': 1e6 * update_time / steps / sessions,
+        'network_ms': 1000.0 * network_time / steps,
+        'actions_per_sec': actions / (update_time + network_time),
+        'memory_kb_per_session': float(memory) / sessions,
+    }
+
+def main(argv):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('-o', '--output', help='write results to this file')
+    parser.add_argument('--sessions', type=int, default=500)
+    parser.add_argument('--steps', type=int, default=300,
+                        help='gravity steps of 1/60 s to run')
+    parser.add_argument('--action-rate', type=float, default=0.1,
+                        help='chance that a client acts in each step')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='compare two result files instead of running')
+    parser.add_argument('--threshold', type=float, default=10.0,
+                        help='percent slowdown that counts as a regression')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        return print_comparison(args.compare[0], args.compare[1],
+                                args.threshold, HIGHER_IS_BETTER)
+    results = run(args.sessions, args.steps, args.action_rate)
+    for name in sorted(results):
+        print('{0:<24} {1:>14.3f}'.format(name, results[name]))
+    if args.output:
+        save(args.output, results)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -1,5 +1,7 @@
 from geom import *
-import random
+from pieces import PieceSource
+from timing import timed
+from collections import deque
 
 BLOCKS = []
 
@@ -51,21 +53,27 @@ class BlockField:
     MAX_SPEED = 20
     SPEED_STEP = 1
     LEVEL_INTERVAL = 10
+    MAX_TICKS = 5
     
     PLAY = 0
     OVER = 1
     
-    def __init__(self, w, h):
+    def __init__(self, w, h, source=None, queue_len=QUEUE_LEN):
         self.w = w
         self.h = h
         self.dump = BlockDump(w, h)
+        if source is None:
+            source = PieceSource(len(BLOCKS))
+        self.source = source
         self.block = None
-        self.queue = []
-        while len(self.queue) < self.QUEUE_LEN:
+        self.cleared = []
+        self.queue = deque()
+        while len(self.queue) < queue_len:
             self.queue_new_block()
         self.get_new_block()
         
         self.lines = 0
+        self.pieces = 0
         self.level = 1
         self.next_level = self.LEVEL_INTERVAL
         self.points = 0
@@ -74,29 +82,50 @@ class BlockField:
         self.last_update = 0
         self.speed = self.MIN_SPEED
         
+    @timed('field.update')
     def update(self, dt):
+        # Runs as many gravity ticks as dt covers, up to MAX_TICKS, after
+        # which the backlog is dropped. Returns the number of ticks.
         if self.state == self.OVER:
-            return
+            return 0
         
         self.last_update += dt
-        if self.last_update > 1.0 / self.speed:
-            self.last_update -= 1.0 / self.speed
-            self.fall()
-            if self.lines >= self.next_level:
-                self.level += 1
-                self.speed = min(self.speed + self.SPEED_STEP, self.MAX_SPEED)
-                self.next_level += self.LEVEL_INTERVAL
+        ticks = 0
+        interval = 1.0 / self.speed
+        while self.last_update > interval and self.state == self.PLAY:
+            if ticks == self.MAX_TICKS:
+                self.last_update = 0
+                break
+            self.last_update -= interval
+            self.tick()
+            ticks += 1
+            interval = 1.0 / self.speed
+        return ticks
+        
+    def can_fall(self):
+        block = self.block
+        collision = self.dump.collide(block.shape, block.rotation,
+                                      block.x, block.y + 1)
+        return not collision & (BlockDump.BLOCK_COL | BlockDump.BOTTOM_COL)
+        
+    def tick(self):
+        self.fall()
+        if self.lines >= self.next_level:
+            self.level += 1
+            self.speed = min(self.speed + self.SPEED_STEP, self.MAX_SPEED)
+            self.next_level += self.LEVEL_INTERVAL
         
     def queue_new_block(self):
-        choice = random.randrange(len(BLOCKS))
+        choice = self.source.next()
         block = Block(BLOCKS[choice], COLORS[choice])
         self.queue.append(block)
         
     def get_new_block(self):
-        self.block = self.queue.pop(0)
-        self.block.x = self.dump.cols / 2 - self.block.matrix.cols / 2
-        self.block.y = -self.block.matrix.rows
         self.queue_new_block()
+        self.block = self.queue.popleft()
+        w, h = self.block.bounds
+        self.block.x = self.dump.cols / 2 - w / 2
+        self.block.y = -h
     
     def move(self, drc):
         self.block.x += drc
@@ -105,30 +134,13 @@ class BlockField:
             self.block.x -= drc
     
     def rotate(self, drc):
-        block = self.block.clone()
-        block.rotate(drc)
-        collision = self.dump.collision(block)
-        
-        if collision == BlockDump.SIDE_COL | BlockDump.BLOCK_COL:
-            return
-        elif collision & BlockDump.SIDE_COL:
-            block.x = self.dump.cols - block.matrix.cols
-            if not self.dump.collision(block):
-                self.block = block
-        elif collision & BlockDump.BLOCK_COL:
-            block.x += 1
-            if self.dump.collision(block) == BlockDump.NO_COL:
-                self.block = block
-                return
-            block.x -= 2
-            if self.dump.collision(block) == BlockDump.NO_COL:
-                self.block = block
-                return
-        elif collision & BlockDump.BOTTOM_COL:
-            block.y = self.dump.rows - block.matrix.rows
-            if not self.dump.collision(block):
-                self.block = block
-        else:
+        block = self.block
+        rotation = (block.rotation + drc) % len(block.shape.rotations)
+        position = self.dump.kick(block.shape, rotation, block.x, block.y)
+        if position is not None:
+            block = block.clone()
+            block.set_rotation(rotation)
+            block.x, block.y = position
             self.block = block
     
     def fall(self):
@@ -136,19 +148,29 @@ class BlockField:
         collision = self.dump.collision(self.block)
         if collision & (BlockDump.BLOCK_COL | BlockDump.BOTTOM_COL):
             self.block.y -= 1
-            self.dump.add_block(self.block)
-            if self.block.y < 0:
-                self.state = self.OVER
-            new_lines = self.dump.remove_filled_lines()
-            self.lines += new_lines
-            self.points += self.level * new_lines**2
-            self.get_new_block()
+            self.lock()
+            
+    def lock(self):
+        self.dump.add_block(self.block)
+        self.pieces += 1
+        if self.block.y < 0:
+            self.state = self.OVER
+        self.cleared = self.dump.clear_lines()
+        new_lines = len(self.cleared)
+        self.lines += new_lines
+        self.points += self.level * new_lines**2
+        self.get_new_block()
+        
+    def landing(self):
+        # The y the current block would be locked at if it was dropped
+        block = self.block
+        return self.dump.landing(block.shape, block.rotation, block.x, block.y)
             
     def drop(self):
-        cur_block = self.block
-        points = 0
-        while self.block == cur_block:
-            self.fall()
-            points += 1
+        # Scores like falling one row at a time, the last fall locking
+        y = self.landing()
+        points = y - self.block.y + 1
+        self.block.y = y
+        self.lock()
         self.points += points / (self.h / 3)
         
@@ -0,0 +1,85 @@
+import time
+import timeit
+from collections import deque
+
+# time.monotonic on Python 3. Python 2 has none, so there this is
+# timeit.default_timer, which is the wall clock on Linux, and setting the
+# clock while a key is held brings its next repeat early or late.
+# os.times() is monotonic but only counts in 10 ms ticks, too coarse for ARR.
+clock = getattr(time, 'monotonic', timeit.default_timer)
+
+PRESS = 0
+RELEASE = 1
+
+# Delayed auto shift and auto repeat rate, in milliseconds
+DAS = 150
+ARR = 50
+
+class Controls(object):
+    '''Turns key presses and releases into actions by the time they happened
+    rather than by how often they are polled.
+
+    bindings maps keys to (action, repeats) pairs. Pressing a key gives its
+    action at once; if it repeats, holding it gives the action again after
+    das milliseconds and then every arr milliseconds. Events are queued with
+    a timestamp from clock and turned into actions, in the order they
+    happened, by actions.
+    '''
+
+    def __init__(self, bindings, das=DAS, arr=ARR, clock=clock):
+        self.bindings = bindings
+        self.das = das / 1000.0
+        self.arr = max(arr, 1) / 1000.0
+        self.clock = clock
+        self.events = deque()
+        # Held keys -> the time of their next repeat, None if they don't
+        self.held = {}
+
+    def press(self, key, timestamp=None):
+        if timestamp is None:
+            timestamp = self.clock()
+        self.events.append((timestamp, PRESS, key))
+
+    def release(self, key, timestamp=None):
+        if timestamp is None:
+            timestamp = self.clock()
+        self.events.append((timestamp, RELEASE, key))
+
+    def clear(self):
+        '''Forgets the queued events and the held keys.'''
+        self.events.clear()
+        self.held.clear()
+
+    def actions(self, until=None):
+        '''Returns the (time, action) pairs of everything that happened up
+        to until, by default now, oldest first.
+        '''
+        if until is None:
+            until = self.clock()
+        res = []
+        events = self.events
+        while events and events[0][0] <= until:
+            timestamp, kind, key = events.popleft()
+            self.repeat(timestamp, res)
+            if kind == RELEASE:
+                self.held.pop(key, None)
+            elif key in self.bindings and key not in self.held:
+                action, repeats = self.bindings[key]
+                res.append((timestamp, action))
+                self.held[key] = timestamp + self.das if repeats else None
+        self.repeat(until, res)
+        return res
+
+    def repeat(self, until, res):
+        # Adds the repeats of the held keys up to until, in time order
+        repeats = []
+        for key, next_time in self.held.items():
+            if next_time is None:
+                continue
+            action = self.bindings[key][0]
+            while next_time <= until:
+                repeats.append((next_time, action))
+                next_time += self.arr
+            self.held[key] = next_time
+        repeats.sort(key=lambda repeat: repeat[0])
+        res.extend(repeats)
@@ -4,31 +4,44 @@ import pyglet
 from pyglet.gl import *
 
 from geom import *
+from timing import timed
 
+# Brightness of the ghost piece relative to the block it shows
+GHOST_SHADE = 0.35
+
+# Vertex lists of shape outlines, keyed by (shape, rotation)
+OUTLINES = {}
+
+def get_outline(shape, rotation):
+    outline = OUTLINES.get((shape, rotation))
+    if outline is None:
+        vertices = []
+        for segment in shape.outlines[rotation]:
+            vertices.extend(segment)
+        outline = pyglet.graphics.vertex_list(len(vertices) / 2,
+                                              ('v2f', vertices))
+        OUTLINES[shape, rotation] = outline
+    return outline
+
+@timed('draw.shape')
+def draw_shape(shape, rotation, color):
+    glColor3f(*color)
+    glLineWidth(3)
+    get_outline(shape, rotation).draw(GL_LINES)
+
+@timed('draw.block')
 def draw_block(block):
-    glColor3f(*block.color)
-    for square in block:
-        x1 = square[0]
-        x2 = square[0] + 1
-        y1 = -square[1]
-        y2 = -square[1] - 1
-        # glRectf(x1, y1, x2, y2)
-        glLineWidth(3)
-        glBegin(GL_LINES)
-        if not block.matrix.get((-y1 - 1, x1), False):
-            glVertex2f(x1, y1)
-            glVertex2f(x2, y1)
-        if not block.matrix.get((-y1, x1 + 1), False):
-            glVertex2f(x2, y1)
-            glVertex2f(x2, y2)
-        if not block.matrix.get((-y1 + 1, x1), False):
-            glVertex2f(x1, y2)
-            glVertex2f(x2, y2)
-        if not block.matrix.get((-y1, x1 - 1), False):
-            glVertex2f(x1, y1)
-            glVertex2f(x1, y2)
-        glEnd()
+    draw_shape(block.shape, block.rotation, block.color)
+    
+def draw_ghost(block, y):
+    # The outline of block where it would land if it was dropped now
+    color = tuple(GHOST_SHADE * c for c in block.color)
+    glPushMatrix()
+    glTranslatef(block.x, -y, 0)
+    draw_shape(block.shape, block.rotation, color)
+    glPopMatrix()
         
+@timed('draw.block_dump')
 def draw_block_dump(dump):
     y = dump.rows
     x = 0
@@ -68,15 +81,93 @@ def draw_block_dump(dump):
         x += 1
         col += 1
 
+class DumpRenderer(object):
+    '''Draws a BlockDump from vertex lists kept in a pyglet Batch, one per
+    row. Rows are only rebuilt when BlockDump.row_versions says that they or
+    one of their neighbours changed, so a static dump costs a single draw.
+    '''
+    
+    EDGE_WIDTH = 0.1
+    EDGE_COLOR = (0.0, 0.0, 0.0, 1.0)
+    
+    def __init__(self, dump):
+        self.dump = dump
+        self.batch = pyglet.graphics.Batch()
+        self.rows = [None] * dump.rows
+        self.row_versions = [-1] * dump.rows
+        self.version = -1
+        
+    def update(self):
+        dump = self.dump
+        if dump.version == self.version:
+            return
+        
+        dirty = set()
+        for row, version in enumerate(dump.row_versions):
+            if version != self.row_versions[row]:
+                self.row_versions[row] = version
+                # Edges depend on the rows above and below as well
+                dirty.update((row - 1, row, row + 1))
+        for row in dirty:
+            if 0 <= row < dump.rows:
+                self.build_row(row)
+        self.version = dump.version
+        
+    def build_row(self, row):
+        if self.rows[row] is not None:
+            self.rows[row].delete()
+            self.rows[row] = None
+        
+        dump = self.dump
+        els = dump.els
+        cols = dump.cols
+        w = self.EDGE_WIDTH
+        y1 = dump.rows - row
+        y2 = y1 - 1
+        vertices = []
+        colors = []
+        
+        def rect(x1, y1, x2, y2, color):
+            vertices.extend((x1, y1, x2, y1, x2, y2, x1, y2))
+            colors.extend(color * 4)
+        
+        for col in range(cols):
+            square = els[row * cols + col]
+            if square == 0:
+                continue
+            
+            x1 = col
+            x2 = col + 1
+            if row == 0 or els[(row - 1) * cols + col] != square:
+                rect(x1, y1, x2, y1 - w, self.EDGE_COLOR)
+            if col == cols - 1 or els[row * cols + col + 1] != square:
+                rect(x2, y1, x2 - w, y2, self.EDGE_COLOR)
+            if row == dump.rows - 1 or els[(row + 1) * cols + col] != square:
+                rect(x1, y2, x2, y2 + w, self.EDGE_COLOR)
+            if col == 0 or els[row * cols + col - 1] != square:
+                rect(x1, y1, x1 + w, y2, self.EDGE_COLOR)
+            rect(x1, y1, x2, y2, square + (0.5,))
+        
+        if vertices:
+            self.rows[row] = self.batch.add(
+                len(vertices) / 2, GL_QUADS, None,
+                ('v2f', vertices), ('c4f', colors))
+            
+    @timed('draw.dump_renderer')
+    def draw(self):
+        self.update()
+        self.batch.draw()
+
+@timed('draw.block_queue')
 def draw_block_queue(queue):
     glPushMatrix()
     glTranslatef(1.0, -0.5, 0.0)
     for block in queue:
-        d_block = Block(block.shape, block.color)
-        draw_block(d_block)
-        glTranslatef(block.matrix.cols + 2, 0, 0)
+        draw_shape(block.shape, 0, block.color)
+        glTranslatef(block.shape.bounds[0][0] + 2, 0, 0)
     glPopMatrix()
 
+@timed('draw.border')
 def draw_border(color, width, height, thickness):
     glColor3f(*color)
     glLineWidth(thickness)
@@ -87,13 +178,17 @@ def draw_border(color, width, height, thickness):
     glVertex2f(0, height)
     glEnd()
     
-def draw_block_field(field):
+@timed('draw.block_field')
+def draw_block_field(field, dump_renderer=None, fall=0.0, ghost=True):
     width = field.w
     height = field.h
     thickness = 3
     
     draw_border((1.0, 1.0, 0.0), width, height, thickness)
-    draw_block_dump(field.dump)
+    if dump_renderer:
+        dump_renderer.draw()
+    else:
+        draw_block_dump(field.dump)
     
     glPushMatrix()
     
@@ -103,8 +198,10 @@ def draw_block_field(field):
     glEnable(GL_CLIP_PLANE0)
     
     if field.block:
+        if ghost:
+            draw_ghost(field.block, field.landing())
         glPushMatrix()
-        glTranslatef(field.block.x, -field.block.y, 0)
+        glTranslatef(field.block.x, -(field.block.y + fall), 0)
         draw_block(field.block)
         glPopMatrix()
         
@@ -124,6 +221,7 @@ def draw_block_field(field):
         
     glPopMatrix()
     
+@timed('draw.cursor_border')
 def draw_cursor_border(width, height, color):
     glTranslatef(0, -height/2, 0)
     draw_border(color, width, height, 2)
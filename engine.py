@@ -0,0 +1,109 @@
+from blockstuff import *
+from pieces import PieceSource
+
+MOVE_LEFT = 0
+MOVE_RIGHT = 1
+ROTATE_LEFT = 2
+ROTATE_RIGHT = 3
+FALL = 4
+DROP = 5
+GRAVITY = 6
+PLACE = 7
+
+ACTIONS = (MOVE_LEFT, MOVE_RIGHT, ROTATE_LEFT, ROTATE_RIGHT, FALL, DROP, GRAVITY)
+
+class EngineException(Exception):
+    '''Raised when an unknown action or an illegal placement is requested.'''
+    pass
+
+class Engine(object):
+    '''Drives a BlockField without a window, clock or GL context. Time only
+    passes when step or update is called, so games run as fast as the CPU
+    allows. Only geom, pieces and blockstuff are imported. The piece sequence
+    is reproducible from seed and generator, see pieces.PieceSource.
+
+    If a recorder, e.g. a replay.ReplayWriter, is given, every action is
+    passed to its record method along with the game time it happened at.
+    '''
+
+    def __init__(self, w=10, h=20, field=None, seed=None, generator='uniform',
+                 recorder=None):
+        if field is None:
+            source = PieceSource(len(BLOCKS), seed, generator)
+            field = BlockField(w, h, source)
+        self.field = field
+        self.recorder = recorder
+        self.time = 0.0
+
+    def is_over(self):
+        return self.field.state == BlockField.OVER
+
+    def apply(self, action):
+        '''Applies a single action to the field, exactly as if the matching
+        key had been handled by GamePage.
+        '''
+        field = self.field
+        if field.state == BlockField.OVER:
+            return
+
+        if action == MOVE_LEFT:
+            field.move(BlockField.LEFT)
+        elif action == MOVE_RIGHT:
+            field.move(BlockField.RIGHT)
+        elif action == ROTATE_LEFT:
+            field.rotate(BlockField.LEFT)
+        elif action == ROTATE_RIGHT:
+            field.rotate(BlockField.RIGHT)
+        elif action == FALL:
+            field.fall()
+        elif action == DROP:
+            field.drop()
+        elif action == GRAVITY:
+            field.tick()
+        else:
+            raise EngineException('Unknown action "{0}"'.format(action))
+
+        if self.recorder:
+            self.recorder.record(action, self.time)
+
+    def update(self, dt):
+        '''Advances the gravity clock of the field by dt seconds. Returns the
+        number of gravity ticks that happened.
+        '''
+        self.time += dt
+        ticks = self.field.update(dt)
+        if self.recorder:
+            for i in range(ticks):
+                self.recorder.record(GRAVITY, self.time)
+        return ticks
+
+    def step(self, actions=(), dt=0.0):
+        '''Applies actions in order and then advances time by dt seconds.
+        Returns True while the game is still running.
+        '''
+        for action in actions:
+            self.apply(action)
+        self.update(dt)
+        return not self.is_over()
+
+    def place(self, x, rotation):
+        '''Puts the current block at column x with the given rotation and
+        drops it. Returns the number of lines the placement cleared.
+        '''
+        field = self.field
+        if field.state == BlockField.OVER:
+            raise EngineException('The game is over.')
+
+        block = field.block.clone()
+        block.set_rotation(rotation % len(block.shape.rotations))
+        block.x = x
+        if field.dump.collision(block) != BlockDump.NO_COL:
+            raise EngineException(
+                'Illegal placement x={0} rotation={1}'.format(x, rotation))
+
+        if self.recorder:
+            self.recorder.record(PLACE, self.time, x, block.rotation)
+        lines = field.lines
+        field.block = block
+        field.drop()
+        return field.lines - lines
@@ -1,16 +1,26 @@
 
+import errno
+import os
+import socket
+import time
+
 import pyglet
 from pyglet.window import key
 from pyglet.gl import *
 
+from assets import Assets
 from blockstuff import *
+from controls import Controls
 from drawing import *
-from keydict import *
+from engine import *
+from leaderboard import Leaderboard
+from replay import ReplayException, ReplayWriter
+from server import RemoteField
+from timing import timed
 import application
-from application import MenuItem, NavItem, TextItem, TitleItem
+from application import BoundLabel, MenuItem, NavItem, TextItem, TitleItem
 
-MENU_IMAGE = pyglet.image.load('res/menu.jpg')
-GAME_IMAGE = pyglet.image.load('res/game_bg.jpg')
+ASSETS = Assets()
 
 WINDOW_WIDTH = 640
 WINDOW_HEIGHT = 480
@@ -20,23 +30,53 @@ FIELD_HEIGHT = 20
 SQUARE_SIZE = WINDOW_HEIGHT / (FIELD_HEIGHT + 2)
 
 SCORES_FILE = './scores.txt'
+LEADERBOARD_FILE = './scores.log'
+PAGE_CACHE_SIZE = 4
+REPLAY_DIR = './replays'
+# Leaderboard name of games left early or submitted without one
+DEFAULT_NAME = 'Player'
 SCORE_TEXT = 'Your score: {0}\nHigh score: {1}'
 LINES_TEXT = 'Lines: {0}'
 LEVEL_TEXT = 'Level: {0}'
 NEXT_LEVEL_TEXT = 'Next in: {0}'
 POINTS_TEXT = 'Points: {0}'
 
-KEY_DELAY = 3
+# Keys -> (engine action, whether holding the key repeats it)
+KEY_BINDINGS = {
+    key.UP: (DROP, False),
+    key.LEFT: (MOVE_LEFT, True),
+    key.RIGHT: (MOVE_RIGHT, True),
+    key.DOWN: (FALL, True),
+    key.Z: (ROTATE_LEFT, False),
+    key.X: (ROTATE_RIGHT, False),
+}
+
+# The game logic runs in fixed steps of LOGIC_STEP seconds, however often
+# frames come; at most MAX_STEPS are caught up per frame.
+LOGIC_STEP = 1.0 / BlockField.MAX_SPEED
+MAX_STEPS = 5
+FRAME_RATE = 60.0
 
-application.set_menu_style(
-    width=WINDOW_WIDTH,
-    height=WINDOW_HEIGHT - 120,
-    text_width=WINDOW_WIDTH / 2,
-    draw_cursor=draw_cursor_border,
-    bg_image=MENU_IMAGE,
-)
+def claim_path(stem, ext):
+    '''Creates an empty file named stem + ext, or stem-1 + ext and so on if
+    that is taken, and returns its path. O_EXCL makes the claim atomic, so
+    games ending in the same second never share a file.
+    '''
+    name = stem + ext
+    suffix = 0
+    while True:
+        try:
+            os.close(os.open(name, os.O_WRONLY | os.O_CREAT | os.O_EXCL))
+            return name
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        suffix += 1
+        name = '{0}-{1}{2}'.format(stem, suffix, ext)
 
 class MainMenu(application.Menu):
+    cacheable = True
+    
     def __init__(self, app):
         super(MainMenu, self).__init__(app)
         
@@ -61,6 +101,8 @@ class MainMenu(application.Menu):
         self.scores_label.draw()
         
 class PauseMenu(application.Menu):
+    cacheable = True
+    
     def __init__(self, app):
         super(PauseMenu, self).__init__(app)
         
@@ -72,14 +114,20 @@ class PauseMenu(application.Menu):
         )
         
 class NewScoreMenu(application.Menu):
+    cacheable = True
+    
     def __init__(self, app):
         super(NewScoreMenu, self).__init__(app)
         
+        self.name_item = TextItem('Name', 15, self)
         self.set_items(
             TitleItem('New High Score!', self),
-            TextItem('Name', 15, self),
+            self.name_item,
             NavItem('Enter', '-', self),
         )
+        
+    def on_destroy(self):
+        self.app.submit_score(self.name_item.text)
 
 class QuitPage(application.Menu):
     def __init__(self, app):
@@ -97,10 +145,21 @@ class QuitPage(application.Menu):
 class GamePage(application.Page):
     def __init__(self, app):
         super(GamePage, self).__init__(app)
-        self.field = BlockField(FIELD_WIDTH, FIELD_HEIGHT)
-        self.keys = KeyDict()
+        # With a server the game is played there and only mirrored here
+        self.remote = self.connect(app.server_address)
+        if self.remote:
+            self.engine = self.remote.engine
+            self.field = self.engine.field
+        else:
+            self.field = BlockField(FIELD_WIDTH, FIELD_HEIGHT)
+            self.engine = Engine(field=self.field, recorder=self.open_replay())
+        self.dump_renderer = DumpRenderer(self.field.dump)
+        self.controls = Controls(KEY_BINDINGS)
+        self.accumulator = 0.0
+        self.ended = False
         
-        self.bg = pyglet.sprite.Sprite(GAME_IMAGE, batch=self.batch)
+        self.bg = pyglet.sprite.Sprite(ASSETS.texture('game_bg.jpg'),
+                                       batch=self.batch)
         
         font_size = SQUARE_SIZE
         x = (FIELD_WIDTH + 2) * SQUARE_SIZE
@@ -114,67 +173,154 @@ class GamePage(application.Page):
             font_size=font_size, x=x, y=y - 2 * font_size, batch=self.batch)
         self.points_label = pyglet.text.Label(
             font_size=font_size, x=x, y=y - 3 * font_size, batch=self.batch)
-            
-        self.update_labels()
+        
+        field = self.field
+        self.hud = [
+            BoundLabel(self.lines_label, LINES_TEXT, lambda: field.lines),
+            BoundLabel(self.level_label, LEVEL_TEXT, lambda: field.level),
+            BoundLabel(self.next_level_label, NEXT_LEVEL_TEXT,
+                       lambda: field.next_level - field.lines),
+            BoundLabel(self.points_label, POINTS_TEXT, lambda: field.points),
+        ]
         
     def on_focus(self):
-        pyglet.clock.schedule_interval(self.step, 1.0/self.field.MAX_SPEED)
+        self.accumulator = 0.0
+        pyglet.clock.schedule_interval(self.step, 1.0/FRAME_RATE)
         
     def on_unfocus(self):
-        self.keys.clear()
+        self.controls.clear()
         pyglet.clock.unschedule(self.step)
         
     def on_destroy(self):
-        self.app.set_last_score(self.field.points)
+        if self.remote:
+            self.remote.close()
+        if self.engine.recorder:
+            self.engine.recorder.close()
+        self.app.end_game(self.result(), ask_name=self.ended)
+        
+    def result(self):
+        replay = None
+        if self.engine.recorder and self.engine.recorder.path:
+            replay = os.path.basename(self.engine.recorder.path)
+        return {
+            'score': self.field.points,
+            'lines': self.field.lines,
+            'level': self.field.level,
+            'replay': replay,
+        }
+        
+    def connect(self, address):
+        # Falls back to playing locally if the server can't be reached
+        if not address:
+            return None
+        try:
+            remote = RemoteField(address)
+            remote.wait()
+            return remote
+        except (socket.error, ReplayException):
+            return None
+        
+    def open_replay(self):
+        try:
+            if not os.path.isdir(REPLAY_DIR):
+                os.makedirs(REPLAY_DIR)
+            stem = os.path.join(REPLAY_DIR, time.strftime('%Y%m%d-%H%M%S'))
+            return ReplayWriter(claim_path(stem, '.rpl'), self.field)
+        except (IOError, OSError):
+            return None
         
     def step(self, dt):
+        # Runs as many logic steps as the time since the last frame covers.
+        # Time beyond MAX_STEPS is dropped, so a long stall slows the game
+        # down for a moment instead of replaying it all at once.
+        if self.remote:
+            self.remote_step()
+            return
+        now = self.controls.clock()
+        self.accumulator += dt
+        steps = 0
+        while self.accumulator >= LOGIC_STEP:
+            if steps == MAX_STEPS:
+                self.accumulator = 0.0
+                break
+            self.accumulator -= LOGIC_STEP
+            steps += 1
+            self.logic_step(now - self.accumulator)
+            if self.field.state == self.field.OVER:
+                self.game_over()
+                return
+        self.update_labels()
+        
+    def remote_step(self):
+        # The server runs gravity; input goes out and the game comes back
         self.process_input()
-        self.field.update(dt)
-        if self.field.state == self.field.OVER:
-            self.app.pop_page()
+        self.remote.poll()
+        if self.remote.is_over():
+            self.game_over()
+            return
         self.update_labels()
         
+    def game_over(self):
+        self.ended = True
+        self.app.pop_page()
+        if self.app.pending_score:
+            self.app.push_page('NewScoreMenu')
+            
+    @timed('tick')
+    def logic_step(self, until):
+        # Input that happened up to the end of the step, then gravity
+        self.process_input(until)
+        self.engine.update(LOGIC_STEP)
+        
+    def fall_offset(self):
+        '''How far the block has fallen towards the next row, from 0 to 1,
+        counting the time that hasn't been simulated yet.
+        '''
+        if self.remote or not self.field.block or not self.field.can_fall():
+            return 0.0
+        elapsed = self.field.last_update + self.accumulator
+        return min(elapsed * self.field.speed, 1.0)
+        
     def update_labels(self):
-        self.lines_label.text = LINES_TEXT.format(self.field.lines)
-        self.level_label.text = LEVEL_TEXT.format(self.field.level)
-        self.next_level_label.text = NEXT_LEVEL_TEXT.format(
-            self.field.next_level - self.field.lines)
-        self.points_label.text = POINTS_TEXT.format(self.field.points)
-    
-    def process_input(self, delay=KEY_DELAY):
-        if self.keys.poll_key_once(key.UP) > delay:
-            self.field.drop()
-        if self.keys.poll_key(key.LEFT) > delay:
-            self.field.move(BlockField.LEFT)
-        if self.keys.poll_key(key.RIGHT) > delay:
-            self.field.move(BlockField.RIGHT)
-        if self.keys.poll_key(key.DOWN) > delay:
-            self.field.fall()
-        if self.keys.poll_key_once(key.Z) > delay:
-            self.field.rotate(BlockField.LEFT)
-        if self.keys.poll_key_once(key.X) > delay:
-            self.field.rotate(BlockField.RIGHT)
+        for label in self.hud:
+            label.refresh()
+        
+    def process_input(self, until=None):
+        for timestamp, action in self.controls.actions(until):
+            if self.remote:
+                self.remote.send(action)
+            else:
+                self.engine.apply(action)
             
     def draw(self):
         super(GamePage, self).draw()
         glScalef(SQUARE_SIZE, SQUARE_SIZE, 1.0)
         glTranslatef(1, 1, 0)
-        draw_block_field(self.field)
+        draw_block_field(self.field, self.dump_renderer, self.fall_offset())
         
     def on_key_press(self, symbol, modifiers):
         if symbol == key.P:
             self.app.push_page('PauseMenu')
         else:
-            self.keys.press_key(symbol)
-            self.process_input(delay=0)
+            # Applied right away rather than on the next step
+            self.controls.press(symbol)
+            self.process_input()
         
     def on_key_release(self, symbol, modifiers):
-        self.keys.release_key(symbol)
+        self.controls.release(symbol)
         
 class BlockGame(application.Application):
-    def __init__(self):
+    def __init__(self, server_address=None):
         super(BlockGame, self).__init__(
             WINDOW_WIDTH, WINDOW_HEIGHT, caption='Block game')
+        self.server_address = server_address
+        application.set_menu_style(
+            width=WINDOW_WIDTH,
+            height=WINDOW_HEIGHT - 120,
+            text_width=WINDOW_WIDTH / 2,
+            draw_cursor=draw_cursor_border,
+            bg_image=ASSETS.lazy_texture('menu.jpg'),
+        )
         self.add_pages(
             MainMenu,
             PauseMenu,
@@ -183,32 +329,42 @@ class BlockGame(application.Application):
             GamePage
         )
         
-        self.high_score = self.load_high_score()
+        self.leaderboard = Leaderboard(LEADERBOARD_FILE, legacy=SCORES_FILE)
         self.last_score = 0
+        self.pending_score = None
+        self.set_page_cache(PAGE_CACHE_SIZE)
         
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
         
         self.push_page('MainMenu')
         
-    def load_high_score(self):
-        try:
-            scores = open(SCORES_FILE, 'r')
-            high_score = int(scores.readline())
-            scores.close()
-        except:
-            scores = open(SCORES_FILE, 'w')
-            scores.write('0')
-            scores.close()
-            high_score = 0
-        return high_score
+    def on_key_press(self, symbol, modifiers):
+        if symbol == key.F3:
+            self.toggle_timing()
+        else:
+            super(BlockGame, self).on_key_press(symbol, modifiers)
+        
+    @property
+    def high_score(self):
+        return self.leaderboard.high_score()
+        
+    def end_game(self, result, ask_name=False):
+        # Records the result of a game, holding it back for the player's name
+        # if it was played to the end and made the leaderboard. Games left
+        # early never reach NewScoreMenu and go in under DEFAULT_NAME.
+        self.last_score = result['score']
+        if not self.leaderboard.qualifies(result['score']):
+            return
+        if ask_name:
+            self.pending_score = result
+        else:
+            result['name'] = DEFAULT_NAME
+            self.leaderboard.add(result)
             
-    def set_last_score(self, score):
-        if score > self.high_score:
-            scores = open(SCORES_FILE, 'w')
-            scores.write(str(score))
-            scores.close()
-            self.high_score = score
-        self.last_score = score
+    def submit_score(self, name):
+        if self.pending_score:
+            self.pending_score['name'] = name or DEFAULT_NAME
+            self.leaderboard.add(self.pending_score)
+            self.pending_score = None
         
-
@@ -69,53 +69,338 @@ class BlockDump(Matrix):
     
     def __init__(self, w, h):
         Matrix.__init__(self, h, w)
+        # One occupancy bitmask per row, bit c set when column c is filled
+        self.full_mask = (1 << self.cols) - 1
+        self.masks = [0] * self.rows
+        # Row of the highest filled square of every column, rows if empty
+        self.tops = [self.rows] * self.cols
+        # One occupancy bitmask per column, bit r set when row r is filled,
+        # and the board features bots evaluate placements by, kept per
+        # column and per row so that changes only recompute what they touch
+        self.full_column = (1 << self.rows) - 1
+        self.columns = [0] * self.cols
+        self.holes = [0] * self.cols
+        self.column_transitions = [0] * self.cols
+        self.wells = [0] * self.cols
+        self.row_transitions = [self.transitions(0)] * self.rows
+        self.update_columns(0, self.cols - 1)
+        # Bumped on every change; row_versions holds the version at which
+        # each row last changed so renderers can rebuild only those rows
+        self.version = 0
+        self.row_versions = [0] * self.rows
+        
+    def __setitem__(self, key, value):
+        row, col = key
+        self.els[self.cols * row + col] = value
+        if value:
+            self.masks[row] |= 1 << col
+            self.columns[col] |= 1 << row
+        else:
+            self.masks[row] &= ~(1 << col)
+            self.columns[col] &= ~(1 << row)
+        self.row_transitions[row] = self.transitions(self.masks[row])
+        self.update_columns(col, col)
+        self.touch(row, row)
+        
+    def copy(self):
+        dump = BlockDump(self.cols, self.rows)
+        dump.els = list(self.els)
+        dump.masks = list(self.masks)
+        dump.tops = list(self.tops)
+        dump.columns = list(self.columns)
+        dump.holes = list(self.holes)
+        dump.column_transitions = list(self.column_transitions)
+        dump.wells = list(self.wells)
+        dump.row_transitions = list(self.row_transitions)
+        return dump
+        
+    def transitions(self, mask):
+        # Filled/empty changes along a row mask, the walls counting as filled
+        m = mask << 1 | 1 | 1 << (self.cols + 1)
+        return bin((m ^ m >> 1) & (1 << (self.cols + 1)) - 1).count('1')
+        
+    def column_features(self, m):
+        # (top, holes, transitions) of a column mask. The floor counts as
+        # filled and the space above the board as empty.
+        rows = self.rows
+        top = (m & -m).bit_length() - 1 if m else rows
+        holes = rows - top - bin(m).count('1')
+        m |= 1 << rows
+        transitions = bin((m ^ m >> 1) & self.full_column).count('1') + (m & 1)
+        return top, holes, transitions
+        
+    def column_wells(self, columns, c):
+        # Cumulative depth of the wells in column c, the empty squares with
+        # both neighbours filled: a well of depth n adds 1 + 2 + ... + n
+        left = columns[c - 1] if c > 0 else self.full_column
+        right = columns[c + 1] if c < self.cols - 1 else self.full_column
+        well = left & right & ~columns[c] & self.full_column
+        wells = 0
+        while well:
+            # Take the lowest run of set bits off the mask
+            start = (well & -well).bit_length() - 1
+            run = well >> start
+            depth = (run ^ run + 1).bit_length() - 1
+            wells += depth * (depth + 1) / 2
+            well &= ~(((1 << depth) - 1) << start)
+        return wells
+        
+    def update_columns(self, first, last):
+        # Refreshes the features of columns first to last, and the wells of
+        # their neighbours
+        columns = self.columns
+        first = max(first, 0)
+        last = min(last, self.cols - 1)
+        for c in range(first, last + 1):
+            self.tops[c], self.holes[c], self.column_transitions[c] = \
+                self.column_features(columns[c])
+        for c in range(max(first - 1, 0), min(last + 1, self.cols - 1) + 1):
+            self.wells[c] = self.column_wells(columns, c)
+                
+    def remove_rows(self, lines):
+        # Takes the given rows, in ascending order, out of the column masks
+        for c, m in enumerate(self.columns):
+            for r in lines:
+                m = (m & (1 << r) - 1) << 1 | m >> (r + 1) << (r + 1)
+            self.columns[c] = m
+        self.update_columns(0, self.cols - 1)
+        
+    def replace_rows(self, rows):
+        # Sets whole rows at once from (row, values) pairs, with one value
+        # per column, recomputing the features once for all of them
+        cols = self.cols
+        for r, values in rows:
+            self.els[cols * r:cols * (r + 1)] = values
+            mask = 0
+            bit = 1 << r
+            for c, value in enumerate(values):
+                if value:
+                    mask |= 1 << c
+                    self.columns[c] |= bit
+                else:
+                    self.columns[c] &= ~bit
+            self.masks[r] = mask
+            self.row_transitions[r] = self.transitions(mask)
+            self.touch(r, r)
+        if rows:
+            self.update_columns(0, cols - 1)
+
+    def touch(self, first, last):
+        self.version += 1
+        for r in range(max(first, 0), min(last, self.rows - 1) + 1):
+            self.row_versions[r] = self.version
     
     def add_block(self, block):
-        for square in block:
-            r = block.y + square[1]
-            c = block.x + square[0]
-            if 0 <= r < self.rows and 0 <= c < self.cols:
-                self[r, c] = block.color
+        els = self.els
+        masks = self.masks
+        columns = self.columns
+        cols = self.cols
+        color = block.color
+        for x, y in block.offsets:
+            r = block.y + y
+            c = block.x + x
+            if 0 <= r < self.rows and 0 <= c < cols:
+                els[cols * r + c] = color
+                masks[r] |= 1 << c
+                columns[c] |= 1 << r
+        w, h = block.bounds
+        for r in range(max(block.y, 0), min(block.y + h, self.rows)):
+            self.row_transitions[r] = self.transitions(masks[r])
+        self.update_columns(block.x, block.x + w - 1)
+        self.touch(block.y, block.y + h - 1)
                 
     def collision(self, block):
+        return self.collide(block.shape, block.rotation, block.x, block.y)
+        
+    def collide(self, shape, rotation, x, y):
+        # Collision flags for a block of shape in the given rotation at (x, y)
         res = BlockDump.NO_COL
+        w, h = shape.bounds[rotation]
         
-        if block.x < 0 or block.x + block.matrix.cols - 1 >= self.cols:
+        if x < 0 or x + w > self.cols:
             res |= BlockDump.SIDE_COL
-        if block.y + block.matrix.rows - 1 >= self.rows:
+        if y + h > self.rows:
             res |= BlockDump.BOTTOM_COL
+        if x >= self.cols or x + w <= 0:
+            # No cell is inside the board to overlap, and shifting the masks
+            # by a huge x would build a huge long
+            return res
             
-        for square in block:
-            r = block.y + square[1]
-            c = block.x + square[0]
-            if 0 <= r < self.rows and 0 <= c < self.cols and self[r, c] != 0:
-                res |= BlockDump.BLOCK_COL
-                break
+        masks = self.masks
+        for i, mask in enumerate(shape.masks[rotation]):
+            r = y + i
+            if 0 <= r < self.rows:
+                if x >= 0:
+                    mask <<= x
+                else:
+                    mask >>= -x
+                if masks[r] & mask:
+                    res |= BlockDump.BLOCK_COL
+                    break
                 
         return res
+        
+    def kick(self, shape, rotation, x, y):
+        # Where a block at (x, y) ends up when it is rotated into rotation:
+        # pushed off the right wall, nudged sideways out of other blocks or
+        # lifted off the floor. None if the rotation isn't possible.
+        collision = self.collide(shape, rotation, x, y)
+        
+        if collision == BlockDump.NO_COL:
+            return x, y
+        elif collision == BlockDump.SIDE_COL | BlockDump.BLOCK_COL:
+            return None
+        elif collision & BlockDump.SIDE_COL:
+            x = self.cols - shape.bounds[rotation][0]
+        elif collision & BlockDump.BLOCK_COL:
+            if self.collide(shape, rotation, x + 1, y) == BlockDump.NO_COL:
+                return x + 1, y
+            x -= 1
+        else:
+            y = self.rows - shape.bounds[rotation][1]
+        
+        if self.collide(shape, rotation, x, y) == BlockDump.NO_COL:
+            return x, y
+        return None
+        
+    def landing(self, shape, rotation, x, y):
+        # The y at which a block of shape at (x, y) comes to rest when it is
+        # dropped. While the block is above the surface of every column it
+        # covers this is found from tops and the skirt of the shape; a block
+        # tucked under an overhang is moved down one row at a time.
+        tops = self.tops
+        res = self.rows
+        for c, bottom in enumerate(shape.skirts[rotation]):
+            if bottom < 0:
+                continue
+            top = tops[x + c]
+            if y + bottom >= top:
+                break
+            res = min(res, top - 1 - bottom)
+        else:
+            return res
+        
+        landed = BlockDump.BLOCK_COL | BlockDump.BOTTOM_COL
+        while not self.collide(shape, rotation, x, y + 1) & landed:
+            y += 1
+        return y
     
     def remove_line(self, line):
-        for r in range(line, -1, -1):
-            all_empty = True
-            for c in range(self.cols):
-                if r == 0:
-                    self[r, c] = 0
-                else:
-                    all_empty = False
-                    self[r, c] = self[r - 1, c]
-            if all_empty:
-                break
+        cols = self.cols
+        self.els[cols:(line + 1) * cols] = self.els[:line * cols]
+        self.els[:cols] = [0] * cols
+        self.masks[1:line + 1] = self.masks[:line]
+        self.masks[0] = 0
+        self.row_transitions[1:line + 1] = self.row_transitions[:line]
+        self.row_transitions[0] = self.transitions(0)
+        self.remove_rows([line])
+        self.touch(0, line)
+        
+    def clear_lines(self):
+        # Removes every full row in one pass, moving the remaining rows down by
+        # whole row slices. Returns the indices the cleared rows had before.
+        full_mask = self.full_mask
+        masks = self.masks
+        cleared = [r for r in range(self.rows) if masks[r] == full_mask]
+        if not cleared:
+            return cleared
+        
+        els = self.els
+        row_transitions = self.row_transitions
+        cols = self.cols
+        dst = cleared[-1]
+        for src in range(dst - 1, -1, -1):
+            if masks[src] == full_mask:
+                continue
+            els[dst * cols:(dst + 1) * cols] = els[src * cols:(src + 1) * cols]
+            masks[dst] = masks[src]
+            row_transitions[dst] = row_transitions[src]
+            dst -= 1
+        
+        top = dst + 1
+        els[:top * cols] = [0] * (top * cols)
+        masks[:top] = [0] * top
+        row_transitions[:top] = [self.transitions(0)] * top
+        self.remove_rows(cleared)
+        self.touch(0, cleared[-1])
+        return cleared
                 
     def remove_filled_lines(self):
-        lines = 0
-        for r in range(self.rows):
-            for c in range(self.cols):
-                if self[r, c] == 0:
-                    break
-            else:
-                self.remove_line(r)
-                lines += 1
-        return lines
+        return len(self.clear_lines())
+        
+    def features(self):
+        # Aggregate statistics of the board for evaluating placements
+        return self.summarize(self.tops, sum(self.holes),
+                              sum(self.row_transitions),
+                              sum(self.column_transitions), sum(self.wells))
+        
+    def summarize(self, tops, holes, row_transitions, column_transitions,
+                  wells):
+        heights = [self.rows - top for top in tops]
+        bumpiness = 0
+        for c in range(1, len(heights)):
+            bumpiness += abs(heights[c] - heights[c - 1])
+        return {
+            'height': sum(heights),
+            'max_height': max(heights),
+            'holes': holes,
+            'bumpiness': bumpiness,
+            'row_transitions': row_transitions,
+            'column_transitions': column_transitions,
+            'wells': wells,
+        }
+        
+    def what_if(self, shape, rotation, x, y):
+        # How features() would change if a block of shape were locked at
+        # (x, y), plus the number of lines that would be cleared, without
+        # changing the dump. Only the rows and columns the block covers are
+        # recomputed unless it completes a line.
+        before = self.features()
+        rows = self.rows
+        cols = self.cols
+        masks = {}
+        columns = list(self.columns)
+        for cx, cy in shape.offsets[rotation]:
+            r = y + cy
+            c = x + cx
+            if 0 <= r < rows and 0 <= c < cols:
+                masks[r] = masks.get(r, self.masks[r]) | 1 << c
+                columns[c] |= 1 << r
+        
+        lines = len([m for m in masks.values() if m == self.full_mask])
+        if lines:
+            block = Block(shape, 1)
+            block.set_rotation(rotation)
+            block.x = x
+            block.y = y
+            dump = self.copy()
+            dump.add_block(block)
+            dump.clear_lines()
+            after = dump.features()
+        else:
+            tops = list(self.tops)
+            holes = before['holes']
+            column_transitions = before['column_transitions']
+            wells = before['wells']
+            w = shape.bounds[rotation][0]
+            for c in range(max(x, 0), min(x + w, cols)):
+                top, c_holes, c_transitions = self.column_features(columns[c])
+                tops[c] = top
+                holes += c_holes - self.holes[c]
+                column_transitions += \
+                    c_transitions - self.column_transitions[c]
+            for c in range(max(x - 1, 0), min(x + w, cols - 1) + 1):
+                wells += self.column_wells(columns, c) - self.wells[c]
+            row_transitions = before['row_transitions']
+            for r, mask in masks.items():
+                row_transitions += \
+                    self.transitions(mask) - self.row_transitions[r]
+            after = self.summarize(tops, holes, row_transitions,
+                                   column_transitions, wells)
+        
+        deltas = dict((name, after[name] - before[name]) for name in before)
+        deltas['lines'] = lines
+        return deltas
         
 class Shape:
     def __init__(self, template):
@@ -123,6 +408,60 @@ class Shape:
         for i in range(3):
             self.rotations.append(self.rotations[i].rotate(Matrix.CW))
         
+        # Lookup tables per rotation so that blocks never have to scan their
+        # matrix: row bitmasks, occupied (x, y) offsets, the lowest occupied y
+        # of every column, the (left, right) x of every row, and (w, h).
+        self.masks = []
+        self.offsets = []
+        self.skirts = []
+        self.extents = []
+        self.bounds = []
+        for matrix in self.rotations:
+            masks = []
+            offsets = []
+            skirt = [-1] * matrix.cols
+            extents = []
+            for r in range(matrix.rows):
+                mask = 0
+                left = right = -1
+                for c in range(matrix.cols):
+                    if matrix[r, c]:
+                        mask |= 1 << c
+                        offsets.append((c, r))
+                        skirt[c] = r
+                        if left < 0:
+                            left = c
+                        right = c
+                masks.append(mask)
+                extents.append((left, right))
+            self.masks.append(tuple(masks))
+            self.offsets.append(tuple(offsets))
+            self.skirts.append(tuple(skirt))
+            self.extents.append(tuple(extents))
+            self.bounds.append((matrix.cols, matrix.rows))
+        
+        # Outer edges of every rotation as (x1, y1, x2, y2) line segments, in
+        # drawing coordinates where y grows upwards from the top of the block
+        self.outlines = [self.outline(offsets) for offsets in self.offsets]
+        
+    def outline(self, offsets):
+        cells = set(offsets)
+        segments = []
+        for x, y in offsets:
+            x1 = x
+            x2 = x + 1
+            y1 = -y
+            y2 = -y - 1
+            if (x, y - 1) not in cells:
+                segments.append((x1, y1, x2, y1))
+            if (x + 1, y) not in cells:
+                segments.append((x2, y1, x2, y2))
+            if (x, y + 1) not in cells:
+                segments.append((x1, y2, x2, y2))
+            if (x - 1, y) not in cells:
+                segments.append((x1, y1, x1, y2))
+        return tuple(segments)
+        
 class Block:
     LEFT = -1
     RIGHT = 1
@@ -132,42 +471,30 @@ class Block:
         self.color = color
         self.x = 0
         self.y = 0
-        self.rotation = 0
-        self.matrix = self.shape.rotations[self.rotation]
+        self.set_rotation(0)
+        
+    def set_rotation(self, rotation):
+        shape = self.shape
+        self.rotation = rotation
+        self.matrix = shape.rotations[rotation]
+        self.masks = shape.masks[rotation]
+        self.offsets = shape.offsets[rotation]
+        self.skirt = shape.skirts[rotation]
+        self.extents = shape.extents[rotation]
+        self.bounds = shape.bounds[rotation]
         
     def rotate(self, drc):
-        self.rotation = (self.rotation + drc) % len(self.shape.rotations)
-        old_matrix = self.matrix
-        self.matrix = self.shape.rotations[self.rotation]
+        self.set_rotation((self.rotation + drc) % len(self.shape.rotations))
         
     def __getitem__(self, key):
         return self.matrix[key]
         
     def __iter__(self):
-        return BlockIterator(self.matrix)
+        return iter(self.offsets)
     
     def clone(self):
         block = Block(self.shape, self.color)
         block.x = self.x
         block.y = self.y
-        block.rotation = self.rotation
-        block.matrix = self.matrix
+        block.set_rotation(self.rotation)
         return block
-        
-class BlockIterator:
-    def __init__(self, matrix):
-        self.els_iter = iter(matrix.els)
-        self.cols = matrix.cols
-        self.position = 0
-        
-    def next(self):
-        while self.els_iter.next() == 0:
-            self.position += 1
-        coord = (self.position % self.cols, self.position / self.cols)
-        self.position += 1
-        return coord
-        
-    def __iter__(self):
-        return self
-
-
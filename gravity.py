@@ -0,0 +1,205 @@
+from blockstuff import BlockField
+
+# Seconds per slot of the finest wheel, a quarter of the server and GUI step
+RESOLUTION = 1.0 / 240
+
+class TimerWheel(object):
+    '''Hierarchical timing wheel of keys due at integer ticks.
+
+    There are levels wheels of 2**bits slots. The finest holds what is due
+    within the next 2**bits ticks, one slot per tick; each coarser level
+    covers 2**bits times as long per slot, and what lies beyond them all
+    waits in an overflow set. Entries move down a level when the wheel
+    reaches their slot, so scheduling and cancelling are O(1) and advancing
+    touches only the slots passed and the keys that fall due.
+    '''
+
+    def __init__(self, bits=6, levels=4):
+        self.bits = bits
+        self.size = 1 << bits
+        self.mask = self.size - 1
+        self.wheels = [[{} for i in range(self.size)] for l in range(levels)]
+        self.overflow = {}
+        self.tick = 0
+        # Keys -> (slot dictionary, due tick)
+        self.slots = {}
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __contains__(self, key):
+        return key in self.slots
+
+    def schedule(self, key, tick):
+        '''Makes key due at tick, or at the next tick if that has passed.'''
+        self.cancel(key)
+        self.place(key, max(tick, self.tick + 1))
+
+    def place(self, key, tick):
+        # key must not be scheduled and tick must be in the future
+        now = self.tick
+        bits = self.bits
+        if tick >> bits == now >> bits:
+            slots = self.wheels[0][tick & self.mask]
+        else:
+            slots = self.overflow
+            for level in range(1, len(self.wheels)):
+                shift = bits * (level + 1)
+                if tick >> shift == now >> shift:
+                    slot = (tick >> bits * level) & self.mask
+                    slots = self.wheels[level][slot]
+                    break
+        slots[key] = tick
+        self.slots[key] = (slots, tick)
+
+    def cancel(self, key):
+        entry = self.slots.pop(key, None)
+        if entry is not None:
+            del entry[0][key]
+
+    def due(self, key):
+        '''Returns the tick key is due at, None if it isn't scheduled.'''
+        entry = self.slots.get(key)
+        return entry[1] if entry else None
+
+    def advance(self, tick):
+        '''Moves on to tick and returns the keys that fell due on the way,
+        in the order they were due. They are no longer scheduled.
+        '''
+        res = []
+        bits = self.bits
+        while self.tick < tick:
+            self.tick += 1
+            now = self.tick
+            # Coarser slots first, since what they hold may land in the
+            # finer slots that are reached at the same time
+            if not now & ((1 << bits * len(self.wheels)) - 1):
+                self.cascade(self.overflow)
+            for level in range(len(self.wheels) - 1, 0, -1):
+                if not now & ((1 << bits * level) - 1):
+                    slot = (now >> bits * level) & self.mask
+                    self.cascade(self.wheels[level][slot])
+            slot = self.wheels[0][now & self.mask]
+            if slot:
+                for key in slot:
+                    del self.slots[key]
+                res.extend(slot)
+                slot.clear()
+        return res
+
+    def cascade(self, slot):
+        entries = list(slot.items())
+        slot.clear()
+        for key, tick in entries:
+            self.place(key, tick)
+
+class Gravity(object):
+    # A scheduled field. Keys the wheel in place of the field, whose old
+    # style class makes hashing it slow.
+    __slots__ = ('field', 'on_tick', 'last', 'deadline')
+
+    def __init__(self, field, on_tick, last):
+        self.field = field
+        self.on_tick = on_tick
+        self.last = last
+        self.deadline = last
+
+class GravityScheduler(object):
+    '''Runs gravity for any number of fields from one clock, touching only
+    the fields that are due.
+
+    Each field's next tick is kept in a TimerWheel of resolution seconds
+    per slot, at 1 / speed after its previous one, so fields at different
+    levels need no polling. A field ticks when the clock has passed its
+    deadline, like BlockField.update, and at most MAX_TICKS times per
+    advance. The next deadline is taken from the speed after every tick, so
+    a level-up takes effect at once; reschedule does the same after any
+    other change of speed.
+
+    advance takes the seconds passed, so it can be called directly from a
+    headless loop or scheduled with pyglet.clock.schedule_interval.
+    '''
+
+    def __init__(self, resolution=RESOLUTION):
+        self.resolution = resolution
+        self.wheel = TimerWheel()
+        self.time = 0.0
+        # id(field) -> Gravity
+        self.entries = {}
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, field):
+        return id(field) in self.entries
+
+    def add(self, field, on_tick=None):
+        '''Starts running gravity for field from now. on_tick is called
+        instead of field.tick, e.g. to apply GRAVITY through an Engine.
+        '''
+        entry = Gravity(field, on_tick or field.tick, self.time)
+        self.entries[id(field)] = entry
+        self.reschedule(field)
+
+    def remove(self, field):
+        entry = self.entries.pop(id(field), None)
+        if entry is not None:
+            self.wheel.cancel(entry)
+
+    def reschedule(self, field):
+        '''Moves the next tick of field to 1 / speed after its previous
+        one.
+        '''
+        entry = self.entries[id(field)]
+        entry.deadline = entry.last + 1.0 / field.speed
+        self.schedule(entry)
+
+    def schedule(self, entry):
+        # The first slot that starts after the deadline
+        self.wheel.schedule(entry, int(entry.deadline / self.resolution) + 1)
+
+    def progress(self, field):
+        '''How far field is from its previous tick towards the next one,
+        from 0 to 1.
+        '''
+        entry = self.entries[id(field)]
+        return min((self.time - entry.last) * field.speed, 1.0)
+
+    def advance(self, dt):
+        '''Moves the clock on by dt seconds and ticks the fields that became
+        due. Returns the number of ticks.
+        '''
+        self.time += dt
+        now = self.time
+        wheel = self.wheel
+        entries = self.entries
+        resolution = self.resolution
+        ticks = 0
+        due = wheel.advance(int(now / resolution))
+        next_tick = wheel.tick + 1
+        for entry in due:
+            field = entry.field
+            count = 0
+            while entry.deadline < now and field.state == BlockField.PLAY:
+                if count == BlockField.MAX_TICKS:
+                    # Drops the backlog, counting time afresh from now
+                    entry.last = now
+                    entry.deadline = now + 1.0 / field.speed
+                    break
+                entry.on_tick()
+                count += 1
+                entry.last = entry.deadline
+                entry.deadline += 1.0 / field.speed
+                # on_tick may have removed the field
+                if id(field) not in entries:
+                    break
+            ticks += count
+            if entries.get(id(field)) is not entry:
+                continue
+            if field.state != BlockField.PLAY:
+                del entries[id(field)]
+            else:
+                # Off the wheel since it fell due, so no need to cancel
+                wheel.place(entry, max(int(entry.deadline / resolution) + 1,
+                                       next_tick))
+        return ticks
@@ -0,0 +1,212 @@
+import atexit
+import heapq
+import json
+import os
+import threading
+import time
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+SIZE = 10
+
+# Appended records beyond the kept entries that trigger a compaction
+COMPACT_AFTER = 100
+
+FIELDS = ('name', 'score', 'lines', 'level', 'date', 'replay')
+
+# Queued to stop the writer thread
+STOP = object()
+
+class Leaderboard(object):
+    '''Keeps the best size entries in a bounded heap. Entries are
+    dictionaries with the keys in FIELDS, ranked by score with earlier
+    entries first on ties.
+
+    Entries are stored in path as an append-only log of JSON lines. The log
+    is read on first use; a line torn by a crash is skipped. Once the log
+    holds COMPACT_AFTER more lines than there are entries it is rewritten
+    with just the entries, into a temporary file that replaces it, so it
+    stays short however many games are played. With background set, writes
+    happen on a separate thread and add never waits for the disk.
+
+    legacy names a file holding one bare high score, as written before there
+    was a leaderboard, that is imported when path doesn't exist yet.
+    '''
+
+    def __init__(self, path, size=SIZE, background=True, legacy=None):
+        self.path = path
+        self.size = size
+        self.background = background
+        self.legacy = legacy
+
+        self.heap = None
+        self.stored = None
+        self.seq = 0
+        self.records = 0
+        self.queue = queue.Queue()
+        self.thread = None
+
+    def load(self):
+        if self.heap is not None:
+            return
+        heap = []
+        records = 0
+        torn = False
+        try:
+            log = open(self.path, 'r')
+        except IOError:
+            log = None
+        if log is not None:
+            try:
+                for line in log:
+                    torn = not line.endswith('\n')
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    records += 1
+                    self.push(heap, self.item(entry))
+            finally:
+                log.close()
+        self.heap = heap
+        # What the log holds, which the writer keeps apart from heap since
+        # added entries reach the log later
+        self.stored = list(heap)
+        self.records = records
+
+        if log is None and self.legacy:
+            self.import_legacy(self.legacy)
+        elif torn or records > len(heap) + COMPACT_AFTER:
+            # A torn last line has to go before anything is appended to it
+            self.write(None)
+
+    def import_legacy(self, path):
+        try:
+            legacy = open(path, 'r')
+            try:
+                score = int(legacy.readline())
+            finally:
+                legacy.close()
+        except (IOError, ValueError):
+            return
+        if score > 0:
+            self.add({'name': '', 'score': score})
+
+    def item(self, entry):
+        # Heap items are (score, -seq, entry) so the lowest score, and the
+        # latest of equal scores, is the first to go
+        self.seq += 1
+        return (entry['score'], -self.seq, entry)
+
+    def push(self, heap, item):
+        if len(heap) < self.size:
+            heapq.heappush(heap, item)
+        elif item > heap[0]:
+            heapq.heapreplace(heap, item)
+        else:
+            return False
+        return True
+
+    def entries(self):
+        '''Returns the entries, best first.'''
+        self.load()
+        return [entry for score, seq, entry in sorted(self.heap, reverse=True)]
+
+    def high_score(self):
+        entries = self.entries()
+        return entries[0]['score'] if entries else 0
+
+    def qualifies(self, score):
+        '''Returns True if an entry with score would be kept.'''
+        self.load()
+        if score <= 0:
+            return False
+        return len(self.heap) < self.size or score > self.heap[0][0]
+
+    def add(self, entry):
+        '''Adds an entry, filling in missing fields, and schedules it to be
+        written. Returns True if it made the leaderboard.
+        '''
+        self.load()
+        entry = dict(entry)
+        for field in FIELDS:
+            entry.setdefault(field, None)
+        if entry['date'] is None:
+            entry['date'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        item = self.item(entry)
+        kept = self.push(self.heap, item)
+        if kept:
+            self.write(item)
+        return kept
+
+    def write(self, item):
+        # None compacts the log instead of appending to it
+        if not self.background:
+            self.store(item)
+            return
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run)
+            self.thread.daemon = True
+            self.thread.start()
+            atexit.register(self.close)
+        self.queue.put(item)
+
+    def run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is STOP:
+                    return
+                self.store(item)
+            except (IOError, OSError):
+                pass
+            finally:
+                self.queue.task_done()
+
+    def store(self, item):
+        if item is not None:
+            log = open(self.path, 'a')
+            try:
+                log.write(json.dumps(item[2], sort_keys=True) + '\n')
+                log.flush()
+                os.fsync(log.fileno())
+            finally:
+                log.close()
+            self.push(self.stored, item)
+            self.records += 1
+        if item is None or self.records > len(self.stored) + COMPACT_AFTER:
+            self.compact()
+
+    def compact(self):
+        entries = [item[2] for item in sorted(self.stored, reverse=True)]
+        tmp_path = self.path + '.tmp'
+        tmp = open(tmp_path, 'w')
+        try:
+            for entry in entries:
+                tmp.write(json.dumps(entry, sort_keys=True) + '\n')
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        finally:
+            tmp.close()
+        try:
+            os.rename(tmp_path, self.path)
+        except OSError:
+            # Windows won't rename over an existing file
+            os.remove(self.path)
+            os.rename(tmp_path, self.path)
+        self.records = len(entries)
+
+    def flush(self):
+        '''Waits until everything added so far is on disk.'''
+        if self.thread is not None:
+            self.queue.join()
+
+    def close(self):
+        '''Finishes the pending writes and stops the writer thread.'''
+        if self.thread is not None:
+            self.queue.put(STOP)
+            self.thread.join()
+            self.thread = None
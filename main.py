@@ -1,8 +1,28 @@
 #!/usr/bin/env python
 
+# Imported first so that startup is timed from here
+import timing
+timing.mark_start()
+
+import os
+
 import pyglet
 import gamestuff
+import server
+
+# BLOCKGAME_TIMING=stats.csv (or .jsonl) records timings from the start and
+# writes them out on exit, including the time from here to the first frame
+# as "startup"; F3 toggles the overlay at any time
+if os.environ.get('BLOCKGAME_TIMING'):
+    timing.enable()
+    timing.dump_at_exit(os.environ['BLOCKGAME_TIMING'])
+
+# BLOCKGAME_SERVER=host:port (or the path of a Unix socket) plays on a
+# server.py instead of locally
+address = os.environ.get('BLOCKGAME_SERVER')
+if address:
+    address = server.parse_address(address)
 
-game = gamestuff.BlockGame()
+game = gamestuff.BlockGame(address)
 pyglet.app.run()
 
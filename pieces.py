@@ -0,0 +1,117 @@
+import random
+from collections import deque
+
+class PieceException(Exception):
+    '''Raised when a piece generator can't be created.'''
+    pass
+
+class UniformGenerator(object):
+    '''Picks every piece independently and uniformly.'''
+
+    def __init__(self, count, seed):
+        self.count = count
+        self.random = random.Random(seed)
+
+    def take(self, n):
+        randrange = self.random.randrange
+        count = self.count
+        return [randrange(count) for i in range(n)]
+
+class BagGenerator(object):
+    '''Deals pieces from shuffled bags that hold every piece once.'''
+
+    def __init__(self, count, seed):
+        self.count = count
+        self.random = random.Random(seed)
+        self.bag = []
+
+    def take(self, n):
+        res = []
+        while len(res) < n:
+            if not self.bag:
+                self.bag = range(self.count)
+                self.random.shuffle(self.bag)
+            need = n - len(res)
+            res.extend(self.bag[:need])
+            del self.bag[:need]
+        return res
+
+class SequenceGenerator(object):
+    '''Repeats a fixed sequence of pieces, either given directly or read from
+    a file of whitespace separated piece indices. The seed picks where in
+    the sequence to start.
+    '''
+
+    def __init__(self, count, seed, path=None, sequence=None):
+        if sequence is None:
+            if path is None:
+                raise PieceException('A sequence or a path is required.')
+            seq_file = open(path, 'r')
+            sequence = [int(piece) for piece in seq_file.read().split()]
+            seq_file.close()
+        sequence = list(sequence)
+        if not sequence:
+            raise PieceException('The piece sequence is empty.')
+        for piece in sequence:
+            if not 0 <= piece < count:
+                raise PieceException('No such piece "{0}"'.format(piece))
+        self.sequence = sequence
+        self.position = (seed or 0) % len(sequence)
+
+    def take(self, n):
+        res = []
+        while len(res) < n:
+            need = n - len(res)
+            chunk = self.sequence[self.position:self.position + need]
+            res.extend(chunk)
+            self.position = (self.position + len(chunk)) % len(self.sequence)
+        return res
+
+GENERATORS = {
+    'uniform': UniformGenerator,
+    'bag': BagGenerator,
+    'sequence': SequenceGenerator,
+}
+
+class PieceSource(object):
+    '''A reproducible stream of piece indices in range(count). Every source
+    owns its generator and random state, so any number of them can live in
+    one process. Without a seed a random one is chosen and kept in seed so
+    the stream can be reproduced later.
+    '''
+
+    CHUNK = 64
+
+    def __init__(self, count, seed=None, generator='uniform', **options):
+        if generator not in GENERATORS:
+            raise PieceException('No such generator "{0}"'.format(generator))
+        if seed is None:
+            seed = random.randrange(2**32)
+        self.count = count
+        self.seed = seed
+        self.generator_name = generator
+        self.generator = GENERATORS[generator](count, seed, **options)
+        self.stream = deque()
+
+    def pregenerate(self, n):
+        '''Generates n more pieces in bulk and keeps them for later calls of
+        next. Returns them as a list.
+        '''
+        pieces = self.generator.take(n)
+        self.stream.extend(pieces)
+        return pieces
+
+    def next(self):
+        if not self.stream:
+            self.pregenerate(self.CHUNK)
+        return self.stream.popleft()
+
+    def peek(self, n):
+        '''Returns the next n pieces without consuming them.'''
+        if len(self.stream) < n:
+            self.pregenerate(max(n - len(self.stream), self.CHUNK))
+        return [self.stream[i] for i in range(n)]
+
+def piece_stream(count, n, seed, generator='uniform', **options):
+    '''Returns the first n pieces a PieceSource with these settings yields.'''
+    return PieceSource(count, seed, generator, **options).pregenerate(n)
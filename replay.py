@@ -0,0 +1,271 @@
+import sys
+
+from engine import *
+from pieces import PieceSource
+
+MAGIC = b'BGRP'
+VERSION = 1
+
+# Record kinds besides the engine actions, which are stored as themselves
+HEADER = 0x40
+END = 0x41
+
+# Piece generators that a PieceSource can be rebuilt from with just the seed
+# the header stores
+SEEDED_GENERATORS = ('uniform', 'bag')
+
+# The longest record a RecordParser accepts, far more than any record needs
+MAX_RECORD = 1024
+
+class ReplayException(Exception):
+    '''Raised when a replay can't be written or read.'''
+    pass
+
+def encode_varint(value, buf):
+    if value < 0:
+        raise ReplayException('Negative value {0}'.format(value))
+    while value >= 0x80:
+        buf.append(value & 0x7f | 0x80)
+        value >>= 7
+    buf.append(value)
+
+def decode_varint(buf, pos):
+    '''Returns the varint at buf[pos] and the position after it.'''
+    value = shift = 0
+    while True:
+        if pos >= len(buf):
+            raise ReplayException('Truncated record.')
+        byte = buf[pos]
+        pos += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+
+def decode_record(payload):
+    '''Splits the payload of a record into its kind and a list of its
+    fields. Action records keep their time delta as the first field.
+    '''
+    kind = payload[0]
+    pos = 1
+    fields = []
+    if kind == HEADER:
+        for i in range(4):
+            value, pos = decode_varint(payload, pos)
+            fields.append(value)
+        fields.append(bytes(payload[pos:]).decode('ascii'))
+    else:
+        while pos < len(payload):
+            value, pos = decode_varint(payload, pos)
+            fields.append(value)
+    return kind, fields
+
+class RecordParser(object):
+    '''Splits a stream of bytes arriving in arbitrary pieces, as from a
+    socket, into record payloads. Records longer than max_record raise a
+    ReplayException rather than being buffered until they are complete.
+    '''
+
+    def __init__(self, max_record=MAX_RECORD):
+        self.buf = bytearray()
+        self.max_record = max_record
+
+    def feed(self, data):
+        '''Adds data and returns the payloads of the records it completed.'''
+        buf = self.buf
+        buf.extend(data)
+        payloads = []
+        pos = 0
+        while pos < len(buf):
+            try:
+                length, start = decode_varint(buf, pos)
+            except ReplayException:
+                # An unfinished length of this many bytes is already too big
+                if 128 ** (len(buf) - pos - 1) > self.max_record:
+                    raise ReplayException('Record too long.')
+                break
+            if length > self.max_record:
+                raise ReplayException('Record too long.')
+            if start + length > len(buf):
+                break
+            if not length:
+                raise ReplayException('Empty record.')
+            payloads.append(buf[start:start + length])
+            pos = start + length
+        del buf[:pos]
+        return payloads
+
+def encode_record(kind, *fields):
+    '''Returns a whole record, length included, of varint fields.'''
+    payload = bytearray([kind])
+    for value in fields:
+        encode_varint(value, payload)
+    buf = bytearray()
+    encode_varint(len(payload), buf)
+    buf.extend(payload)
+    return bytes(buf)
+
+class ReplayWriter(object):
+    '''Streams the actions applied to a field to out, a binary file object
+    or a path. Each record is its length as a varint followed by a kind byte
+    and varint fields; actions store the milliseconds since the previous
+    record. Records are written as they happen, so recordings of any length
+    never sit in memory. Pass the writer to an Engine as its recorder and
+    call close when the game is done. The field's pieces must come from one
+    of SEEDED_GENERATORS, since the header only holds the seed.
+    '''
+
+    def __init__(self, out, field):
+        source = field.source
+        seed = getattr(source, 'seed', None)
+        if not isinstance(seed, (int, long)) or seed < 0:
+            raise ReplayException('The piece source has no usable seed.')
+        if source.generator_name not in SEEDED_GENERATORS:
+            raise ReplayException(
+                'The "{0}" generator can\'t be rebuilt from its seed.'.format(
+                    source.generator_name))
+
+        if hasattr(out, 'write'):
+            self.path = getattr(out, 'name', None)
+            self.out = out
+        else:
+            self.path = out
+            self.out = open(out, 'wb')
+        self.field = field
+        self.last_ms = 0
+
+        self.out.write(MAGIC + bytes(bytearray([VERSION])))
+        buf = bytearray([HEADER])
+        for value in (seed, field.w, field.h, len(field.queue)):
+            encode_varint(value, buf)
+        buf.extend(source.generator_name.encode('ascii'))
+        self.write(buf)
+
+    def write(self, payload):
+        buf = bytearray()
+        encode_varint(len(payload), buf)
+        buf.extend(payload)
+        self.out.write(bytes(buf))
+
+    def record(self, action, time, *args):
+        ms = int(round(time * 1000))
+        buf = bytearray([action])
+        encode_varint(max(ms - self.last_ms, 0), buf)
+        for value in args:
+            encode_varint(value, buf)
+        self.last_ms = max(ms, self.last_ms)
+        self.write(buf)
+
+    def close(self):
+        '''Writes the final score of the field and closes the file.'''
+        if self.out is None:
+            return
+        buf = bytearray([END])
+        field = self.field
+        for value in (field.points, field.lines, field.pieces):
+            encode_varint(value, buf)
+        self.write(buf)
+        self.out.close()
+        self.out = None
+
+def read_records(source):
+    '''Yields the records of a replay, given as a binary file object or a
+    path, one at a time as (kind, time, fields). time is the game time of
+    the record in seconds; fields is a list of the record's integers, plus
+    the generator name for the header.
+    '''
+    if hasattr(source, 'read'):
+        replay_file = source
+    else:
+        replay_file = open(source, 'rb')
+
+    try:
+        start = replay_file.read(len(MAGIC) + 1)
+        if start[:len(MAGIC)] != MAGIC:
+            raise ReplayException('Not a replay file.')
+        if bytearray(start[len(MAGIC):])[0] != VERSION:
+            raise ReplayException('Unsupported replay version.')
+
+        ms = 0
+        while True:
+            length = shift = 0
+            while True:
+                byte = replay_file.read(1)
+                if not byte:
+                    if shift:
+                        raise ReplayException('Truncated record.')
+                    return
+                byte = bytearray(byte)[0]
+                length |= (byte & 0x7f) << shift
+                shift += 7
+                if byte < 0x80:
+                    break
+
+            payload = bytearray(replay_file.read(length))
+            if len(payload) != length or not length:
+                raise ReplayException('Truncated record.')
+            kind, fields = decode_record(payload)
+            if kind not in (HEADER, END):
+                ms += fields.pop(0)
+            yield kind, ms / 1000.0, fields
+    finally:
+        if replay_file is not source:
+            replay_file.close()
+
+def start_replay(records):
+    '''Takes the header off an iterator of records and returns a new engine
+    set up the way the recorded game started.
+    '''
+    for kind, time, fields in records:
+        if kind != HEADER:
+            raise ReplayException('The replay has no header.')
+        seed, w, h, queue_len, generator = fields
+        break
+    else:
+        raise ReplayException('The replay is empty.')
+
+    source = PieceSource(len(BLOCKS), seed, generator)
+    return Engine(field=BlockField(w, h, source, queue_len))
+
+def apply_record(engine, kind, time, fields):
+    '''Applies one record after the header to engine. Returns the recorded
+    (points, lines, pieces) for the end record and None otherwise.
+    '''
+    engine.time = time
+    if kind == END:
+        return tuple(fields)
+    elif kind == PLACE:
+        engine.place(*fields)
+    elif kind in ACTIONS:
+        engine.apply(kind)
+    else:
+        raise ReplayException('Unknown record kind {0}'.format(kind))
+
+def play_replay(source):
+    '''Re-runs a replay headlessly as fast as possible. Returns the engine
+    the replay was played on and the recorded (points, lines, pieces), or
+    None for the latter if the recording never finished.
+    '''
+    records = read_records(source)
+    engine = start_replay(records)
+    end = None
+    for kind, time, fields in records:
+        end = apply_record(engine, kind, time, fields) or end
+    return engine, end
+
+def verify(source):
+    '''Returns True if replaying source ends with the recorded score.'''
+    engine, end = play_replay(source)
+    field = engine.field
+    return end == (field.points, field.lines, field.pieces)
+
+if __name__ == '__main__':
+    failed = False
+    for path in sys.argv[1:]:
+        engine, end = play_replay(path)
+        field = engine.field
+        ok = end == (field.points, field.lines, field.pieces)
+        failed = failed or not ok
+        sys.stdout.write('{0}: {1} ({2} points, {3} lines)\n'.format(
+            path, 'ok' if ok else 'MISMATCH', field.points, field.lines))
+    sys.exit(1 if failed else 0)
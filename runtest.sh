@@ -1 +1 @@
-watch python test/test_keydict.py
+watch python -m unittest discover -s test -p 'test_*.py'
@@ -0,0 +1,98 @@
+from collections import deque
+
+from engine import *
+
+LANDED = BlockDump.BLOCK_COL | BlockDump.BOTTOM_COL
+
+def placements(dump, block, distinct=True):
+    '''Finds every position the block can come to rest in on dump, using the
+    moves, rotations and falls of BlockField while ignoring gravity. Returns
+    a list of (x, y, rotation, path) tuples, where path is the shortest list
+    of engine actions leading there from the block's current position.
+    Applying the path followed by DROP locks the block in that position.
+
+    States are searched breadth first and every (x, y, rotation) state is
+    expanded at most once. With distinct set, rotations that cover the same
+    squares (e.g. all four of the O block) are reported once.
+    '''
+    shape = block.shape
+    rotations = len(shape.rotations)
+    collide = dump.collide
+    kick = dump.kick
+
+    start = (block.x, block.y, block.rotation)
+    if collide(shape, block.rotation, block.x, block.y) != BlockDump.NO_COL:
+        return []
+
+    # Transposition table: state -> (previous state, action)
+    seen = {start: None}
+    frontier = deque([start])
+    resting = []
+    while frontier:
+        state = frontier.popleft()
+        x, y, rotation = state
+
+        moves = []
+        if collide(shape, rotation, x - 1, y) == BlockDump.NO_COL:
+            moves.append((MOVE_LEFT, (x - 1, y, rotation)))
+        if collide(shape, rotation, x + 1, y) == BlockDump.NO_COL:
+            moves.append((MOVE_RIGHT, (x + 1, y, rotation)))
+        for action, drc in ((ROTATE_LEFT, Block.LEFT),
+                            (ROTATE_RIGHT, Block.RIGHT)):
+            turned = (rotation + drc) % rotations
+            position = kick(shape, turned, x, y)
+            if position is not None:
+                moves.append((action, position + (turned,)))
+        if collide(shape, rotation, x, y + 1) & LANDED:
+            resting.append(state)
+        else:
+            moves.append((FALL, (x, y + 1, rotation)))
+
+        for action, next_state in moves:
+            if next_state not in seen:
+                seen[next_state] = (state, action)
+                frontier.append(next_state)
+
+    res = []
+    footprints = set()
+    for state in resting:
+        x, y, rotation = state
+        if distinct:
+            footprint = (x, y, shape.offsets[rotation])
+            if footprint in footprints:
+                continue
+            footprints.add(footprint)
+        res.append((x, y, rotation, path_to(seen, state)))
+    return res
+
+def path_to(seen, state):
+    path = []
+    step = seen[state]
+    while step is not None:
+        state, action = step
+        path.append(action)
+        step = seen[state]
+    path.reverse()
+    return path
+
+def drops(dump, block, distinct=True):
+    '''Finds every position the block reaches when it is turned and moved at
+    its current height and then dropped, as Engine.place would put it.
+    Returns a list of (x, y, rotation) tuples. Landing rows come from the
+    column tops of the dump, so this is much cheaper than placements for
+    bots that only ever place blocks.
+    '''
+    shape = block.shape
+    res = []
+    footprints = set()
+    for rotation in range(len(shape.rotations)):
+        if distinct:
+            if shape.offsets[rotation] in footprints:
+                continue
+            footprints.add(shape.offsets[rotation])
+        for x in range(dump.cols - shape.bounds[rotation][0] + 1):
+            if dump.collide(shape, rotation, x, block.y) != BlockDump.NO_COL:
+                continue
+            res.append((x, dump.landing(shape, rotation, x, block.y),
+                        rotation))
+    return res
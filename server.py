@@ -0,0 +1,333 @@
+#!/usr/bin/env python
+'''Server-authoritative network play.
+
+    python server.py 7777
+    python server.py /tmp/blockgame.sock
+    BLOCKGAME_SERVER=localhost:7777 python main.py
+
+GameServer owns one Engine per connected client and runs all of them from a
+single asyncore loop, with their gravity in one GravityScheduler. Clients
+only send the actions they want; the server applies them and streams the
+game back in the replay format, gravity ticks included, so clients mirror
+the authoritative game and the score can't be tampered with. RemoteField is
+the client side.
+'''
+import asyncore
+import random
+import select
+import socket
+import sys, os
+import timeit
+
+from engine import *
+from gravity import GravityScheduler
+from replay import *
+from search import placements
+
+# What clients may ask for; gravity belongs to the server
+CLIENT_ACTIONS = (MOVE_LEFT, MOVE_RIGHT, ROTATE_LEFT, ROTATE_RIGHT, FALL, DROP,
+                  PLACE)
+
+# poll has no limit on the number of sockets, unlike select
+USE_POLL = hasattr(select, 'poll')
+
+def parse_address(text):
+    '''Turns host:port into a TCP address and anything else into the path of
+    a Unix socket.
+    '''
+    if ':' in text:
+        host, port = text.rsplit(':', 1)
+        return host, int(port)
+    return text
+
+def address_family(address):
+    if isinstance(address, basestring):
+        return socket.AF_UNIX
+    return socket.AF_INET
+
+class SessionStream(object):
+    '''The file a session's ReplayWriter writes to. Closing it closes the
+    connection once everything written has been sent.
+    '''
+
+    def __init__(self, session):
+        self.session = session
+
+    def write(self, data):
+        self.session.out.extend(data)
+
+    def close(self):
+        self.session.closing = True
+
+class Session(asyncore.dispatcher):
+    '''One client's game. Kept small since a server holds thousands: the
+    engine, an output buffer and a record parser.
+    '''
+
+    def __init__(self, server, sock, seed):
+        asyncore.dispatcher.__init__(self, sock, map=server.map)
+        self.server = server
+        self.out = bytearray()
+        self.closing = False
+        self.parser = RecordParser()
+        self.engine = Engine(server.w, server.h, seed=seed,
+                             generator=server.generator)
+        self.engine.recorder = ReplayWriter(SessionStream(self),
+                                            self.engine.field)
+        self.started = server.scheduler.time
+        server.scheduler.add(self.engine.field, self.gravity)
+
+    def sync(self):
+        # Game time is kept by the server's scheduler
+        self.engine.time = self.server.scheduler.time - self.started
+
+    def gravity(self):
+        self.sync()
+        self.engine.apply(GRAVITY)
+        if self.engine.is_over():
+            self.finish()
+
+    def handle_read(self):
+        data = self.recv(4096)
+        if not data or self.closing:
+            return
+        try:
+            payloads = self.parser.feed(data)
+        except ReplayException:
+            self.drop()
+            return
+        for payload in payloads:
+            kind, fields = decode_record(payload)
+            if kind not in CLIENT_ACTIONS:
+                self.drop()
+                return
+            self.sync()
+            if kind == PLACE:
+                if len(fields) != 2 or not (0 <= fields[0] < self.server.w and
+                                            0 <= fields[1] < 4):
+                    self.drop()
+                    return
+                # Placements gravity made unreachable are ignored
+                if self.reachable(*fields):
+                    self.engine.place(*fields)
+            else:
+                self.engine.apply(kind)
+            if self.engine.is_over():
+                self.finish()
+                return
+
+    def reachable(self, x, rotation):
+        # Whether dropping the block at column x in rotation ends where it
+        # could have been moved to, so that PLACE can't pass through walls
+        field = self.engine.field
+        block = field.block
+        rotation %= len(block.shape.rotations)
+        if field.dump.collide(block.shape, rotation, x, block.y):
+            return False
+        y = field.dump.landing(block.shape, rotation, x, block.y)
+        return any(p[:3] == (x, y, rotation)
+                   for p in placements(field.dump, block, distinct=False))
+
+    def writable(self):
+        return bool(self.out) or self.closing
+
+    def handle_write(self):
+        if self.out:
+            sent = self.send(bytes(self.out[:65536]))
+            del self.out[:sent]
+        if self.closing and not self.out:
+            self.close()
+
+    def handle_close(self):
+        self.drop()
+
+    def finish(self):
+        '''Sends the final score and closes the connection after it.'''
+        self.server.remove(self)
+        self.engine.recorder.close()
+
+    def drop(self):
+        self.server.remove(self)
+        self.close()
+
+class GameServer(asyncore.dispatcher):
+    '''Accepts clients on address, a (host, port) pair or the path of a Unix
+    socket, and gives each a new game on a w by h field.
+    '''
+
+    def __init__(self, address, w=10, h=20, generator='uniform', seed=None):
+        self.map = {}
+        asyncore.dispatcher.__init__(self, map=self.map)
+        family = address_family(address)
+        self.create_socket(family, socket.SOCK_STREAM)
+        if family == socket.AF_INET:
+            self.set_reuse_addr()
+        self.bind(address)
+        self.listen(128)
+        self.address = self.socket.getsockname()
+
+        self.w = w
+        self.h = h
+        self.generator = generator
+        self.random = random.Random(seed)
+        self.scheduler = GravityScheduler()
+        self.sessions = set()
+
+    def handle_accept(self):
+        pair = self.accept()
+        if pair is None:
+            return
+        sock, address = pair
+        if address_family(self.address) == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        seed = self.random.randrange(2**31)
+        self.sessions.add(Session(self, sock, seed))
+
+    def remove(self, session):
+        self.sessions.discard(session)
+        self.scheduler.remove(session.engine.field)
+
+    def update(self, dt):
+        '''Advances the clock of every game by dt seconds, running gravity
+        for the ones that are due.
+        '''
+        self.scheduler.advance(dt)
+
+    def poll(self, timeout=0.0):
+        '''Handles the network events that are ready, waiting up to timeout
+        seconds for one.
+        '''
+        asyncore.loop(timeout, USE_POLL, self.map, 1)
+
+    def serve_forever(self, tick=1.0 / BlockField.MAX_SPEED):
+        clock = timeit.default_timer
+        last = clock()
+        while True:
+            self.poll(tick)
+            now = clock()
+            self.update(now - last)
+            last = now
+
+    def close(self):
+        for dispatcher in list(self.map.values()):
+            if dispatcher is not self:
+                dispatcher.close()
+        for session in list(self.sessions):
+            self.remove(session)
+        asyncore.dispatcher.close(self)
+        if address_family(self.address) == socket.AF_UNIX:
+            try:
+                os.remove(self.address)
+            except OSError:
+                pass
+
+class RemoteField(object):
+    '''Plays on a GameServer. The field and engine mirror the server's game
+    from what it sends back; send and place ask it for actions, and poll
+    takes in whatever has arrived.
+    '''
+
+    def __init__(self, address, timeout=5.0):
+        family = address_family(address)
+        self.sock = socket.socket(family, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        self.sock.connect(address)
+        if family == socket.AF_INET:
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.poller = None
+        if USE_POLL:
+            self.poller = select.poll()
+            self.poller.register(self.sock, select.POLLIN)
+
+        self.start = bytearray()
+        self.parser = RecordParser()
+        self.engine = None
+        self.ms = 0
+        self.end = None
+        self.closed = False
+
+    @property
+    def field(self):
+        return self.engine.field if self.engine else None
+
+    def send(self, action):
+        if not self.closed:
+            self.sock.sendall(encode_record(action))
+
+    def place(self, x, rotation):
+        if not self.closed:
+            self.sock.sendall(encode_record(PLACE, x, rotation))
+
+    def poll(self, timeout=0.0):
+        '''Applies what the server sent, waiting up to timeout seconds for
+        something to arrive. Returns False once the connection is closed.
+        '''
+        while not self.closed:
+            if self.poller:
+                readable = self.poller.poll(int(timeout * 1000))
+            else:
+                readable = select.select([self.sock], [], [], timeout)[0]
+            if not readable:
+                break
+            timeout = 0.0
+            try:
+                data = self.sock.recv(65536)
+            except socket.error:
+                # Reset by a server that dropped us
+                data = None
+            if not data:
+                self.close()
+                break
+            self.receive(data)
+        return not self.closed
+
+    def wait(self, timeout=5.0):
+        '''Blocks until the game has started.'''
+        while self.engine is None and self.poll(timeout):
+            pass
+        if self.engine is None:
+            raise ReplayException('The server sent no game.')
+
+    def receive(self, data):
+        start = len(MAGIC) + 1
+        if len(self.start) < start:
+            needed = start - len(self.start)
+            self.start.extend(data[:needed])
+            data = data[needed:]
+            if len(self.start) == start and \
+                    bytes(self.start) != MAGIC + bytes(bytearray([VERSION])):
+                raise ReplayException('Not a game server.')
+
+        for payload in self.parser.feed(data):
+            kind, fields = decode_record(payload)
+            if kind == HEADER:
+                self.engine = start_replay([(kind, 0.0, fields)])
+            elif kind == END:
+                self.end = tuple(fields)
+            else:
+                self.ms += fields.pop(0)
+                apply_record(self.engine, kind, self.ms / 1000.0, fields)
+
+    def is_over(self):
+        return self.closed or self.end is not None or \
+            (self.engine is not None and self.engine.is_over())
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.sock.close()
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        sys.exit('usage: server.py PORT|HOST:PORT|SOCKET_PATH')
+    address = sys.argv[1]
+    if address.isdigit():
+        address = ('', int(address))
+    else:
+        address = parse_address(address)
+    server = GameServer(address)
+    sys.stdout.write('Serving on {0}\n'.format(server.address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
@@ -0,0 +1,260 @@
+'''Compact streaming of a BlockField for spectators and remote rendering.
+
+A FieldEncoder turns the state of a field into one frame per call, usually
+once per tick. Most frames are deltas holding only what changed since the
+previous frame: the block's position and rotation, the rows that
+BlockDump.row_versions marks as changed, the queue and the score. Every
+keyframe_interval frames, and whenever one is asked for, a keyframe holds
+everything, so that viewers can join mid-stream and recover from lost
+frames. A FieldDecoder applies the frames to a BlockField of its own that
+can be drawn with drawing.draw_block_field like a local one.
+
+Frames are a kind byte and a sequence number followed by varint fields.
+Squares are packed two to a byte as an index into COLORS, 0 being empty.
+'''
+from blockstuff import *
+from replay import encode_varint, decode_varint, ReplayException
+
+KEYFRAME = 0x01
+DELTA = 0x02
+
+# What a delta holds
+BLOCK = 1
+ROWS = 2
+QUEUE = 4
+SCORE = 8
+
+KEYFRAME_INTERVAL = 120
+
+SHAPE_INDEX = dict((id(shape), i) for i, shape in enumerate(BLOCKS))
+COLOR_INDEX = dict((color, i + 1) for i, color in enumerate(COLORS))
+SQUARE_COLORS = [0] + COLORS
+
+class StreamException(Exception):
+    '''Raised for frames that can't be encoded or decoded.'''
+    pass
+
+def zigzag(value):
+    # Maps signed integers onto unsigned ones, small magnitudes staying small
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+def unzigzag(value):
+    return value >> 1 if not value & 1 else -((value + 1) >> 1)
+
+def pack_row(values):
+    buf = bytearray((len(values) + 1) / 2)
+    try:
+        for c, value in enumerate(values):
+            index = COLOR_INDEX[value] if value else 0
+            buf[c >> 1] |= index << ((c & 1) << 2)
+    except KeyError:
+        raise StreamException('Unknown square color {0}'.format(value))
+    return bytes(buf)
+
+def unpack_row(buf, pos, cols):
+    values = []
+    for c in range(cols):
+        index = buf[pos + (c >> 1)] >> ((c & 1) << 2) & 0x0f
+        values.append(SQUARE_COLORS[index])
+    return values
+
+class FieldEncoder(object):
+    '''Encodes the state of field into frames. frame returns the next one,
+    a keyframe every keyframe_interval frames or after request_keyframe.
+    '''
+
+    def __init__(self, field, keyframe_interval=KEYFRAME_INTERVAL):
+        self.field = field
+        self.keyframe_interval = keyframe_interval
+        self.seq = 0
+        self.keyframe_due = True
+        self.row_versions = [None] * field.h
+        self.rows = [None] * field.h
+        self.block = None
+        self.queue = None
+        self.score = None
+
+    def request_keyframe(self):
+        '''Makes the next frame a keyframe, e.g. for a new viewer.'''
+        self.keyframe_due = True
+
+    def frame(self):
+        field = self.field
+        keyframe = self.keyframe_due or \
+            self.seq % self.keyframe_interval == 0
+        self.keyframe_due = False
+
+        buf = bytearray([KEYFRAME if keyframe else DELTA])
+        encode_varint(self.seq, buf)
+        self.seq += 1
+
+        block = field.block
+        block = (SHAPE_INDEX[id(block.shape)], block.rotation,
+                 zigzag(block.x), zigzag(block.y))
+        queue = [SHAPE_INDEX[id(queued.shape)] for queued in field.queue]
+        score = (field.points, field.lines, field.level, field.pieces,
+                 field.speed, field.state)
+        rows = self.changed_rows(keyframe)
+
+        if keyframe:
+            encode_varint(field.w, buf)
+            encode_varint(field.h, buf)
+            flags = BLOCK | QUEUE | SCORE
+        else:
+            flags = 0
+            if block != self.block:
+                flags |= BLOCK
+            if rows:
+                flags |= ROWS
+            if queue != self.queue:
+                flags |= QUEUE
+            if score != self.score:
+                flags |= SCORE
+            buf.append(flags)
+
+        if flags & BLOCK:
+            for value in block:
+                encode_varint(value, buf)
+        if keyframe:
+            for r in range(field.h):
+                buf.extend(self.rows[r])
+        elif flags & ROWS:
+            encode_varint(len(rows), buf)
+            for r in rows:
+                encode_varint(r, buf)
+                buf.extend(self.rows[r])
+        if flags & QUEUE:
+            encode_varint(len(queue), buf)
+            buf.extend(bytearray(queue))
+        if flags & SCORE:
+            for value in score:
+                encode_varint(value, buf)
+
+        self.block = block
+        self.queue = queue
+        self.score = score
+        return bytes(buf)
+
+    def changed_rows(self, everything=False):
+        # Packs the rows row_versions says changed since the last frame and
+        # returns those that did. A line clear marks every row above it, but
+        # only the ones that really moved get sent.
+        dump = self.field.dump
+        cols = dump.cols
+        els = dump.els
+        changed = []
+        for r, version in enumerate(dump.row_versions):
+            if version == self.row_versions[r] and not everything:
+                continue
+            self.row_versions[r] = version
+            packed = pack_row(els[cols * r:cols * (r + 1)])
+            if packed != self.rows[r]:
+                self.rows[r] = packed
+                changed.append(r)
+        return changed
+
+class FieldDecoder(object):
+    '''Rebuilds a field from the frames of a FieldEncoder. field is None
+    until the first keyframe arrives.
+    '''
+
+    def __init__(self):
+        self.field = None
+        self.seq = None
+
+    def decode(self, frame):
+        '''Applies frame to the field. Returns False, changing nothing, for
+        a delta that doesn't follow the last frame applied, in which case
+        deltas are skipped until the next keyframe.
+        '''
+        buf = bytearray(frame)
+        if not buf:
+            raise StreamException('Empty frame.')
+        kind = buf[0]
+        if kind not in (KEYFRAME, DELTA):
+            raise StreamException('Unknown frame kind {0}'.format(kind))
+        try:
+            seq, pos = decode_varint(buf, 1)
+            if kind == DELTA:
+                if self.seq is None or seq != self.seq + 1:
+                    self.seq = None
+                    return False
+                flags = buf[pos]
+                pos += 1
+            else:
+                w, pos = decode_varint(buf, pos)
+                h, pos = decode_varint(buf, pos)
+                self.start(w, h)
+                flags = BLOCK | ROWS | QUEUE | SCORE
+            pos = self.apply(kind, flags, buf, pos)
+        except (IndexError, ReplayException):
+            self.seq = None
+            raise StreamException('Truncated frame.')
+        if pos != len(buf):
+            raise StreamException('Trailing bytes in frame.')
+        self.seq = seq
+        return True
+
+    def start(self, w, h):
+        field = self.field
+        if field is None or (field.w, field.h) != (w, h):
+            self.field = BlockField(w, h)
+
+    def apply(self, kind, flags, buf, pos):
+        field = self.field
+        dump = field.dump
+        if flags & BLOCK:
+            values = []
+            for i in range(4):
+                value, pos = decode_varint(buf, pos)
+                values.append(value)
+            shape, rotation, x, y = values
+            block = field.block
+            if block is None or block.shape is not BLOCKS[shape]:
+                block = Block(BLOCKS[shape], COLORS[shape])
+            if block.rotation != rotation:
+                block.set_rotation(rotation)
+            block.x = unzigzag(x)
+            block.y = unzigzag(y)
+            field.block = block
+
+        row_size = (dump.cols + 1) / 2
+        if kind == KEYFRAME:
+            rows = []
+            for r in range(dump.rows):
+                rows.append((r, unpack_row(buf, pos, dump.cols)))
+                pos += row_size
+            dump.replace_rows(rows)
+        elif flags & ROWS:
+            count, pos = decode_varint(buf, pos)
+            rows = []
+            for i in range(count):
+                r, pos = decode_varint(buf, pos)
+                rows.append((r, unpack_row(buf, pos, dump.cols)))
+                pos += row_size
+            dump.replace_rows(rows)
+        if pos > len(buf):
+            raise IndexError(pos)
+
+        if flags & QUEUE:
+            count, pos = decode_varint(buf, pos)
+            queue = field.queue
+            shapes = buf[pos:pos + count]
+            if len(shapes) != count:
+                raise IndexError(pos)
+            pos += count
+            if [SHAPE_INDEX[id(queued.shape)] for queued in queue] != \
+                    list(shapes):
+                queue.clear()
+                for shape in shapes:
+                    queue.append(Block(BLOCKS[shape], COLORS[shape]))
+
+        if flags & SCORE:
+            values = []
+            for i in range(6):
+                value, pos = decode_varint(buf, pos)
+                values.append(value)
+            (field.points, field.lines, field.level, field.pieces,
+             field.speed, field.state) = values
+            field.next_level = field.level * field.LEVEL_INTERVAL
+        return pos
@@ -0,0 +1,117 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from testutil import import_stubbed
+
+class FakeWindow(object):
+    '''Stands in for pyglet.window.Window, which needs a display.'''
+
+    def __init__(self, width, height, **kwargs):
+        self.handlers = []
+        self.closed = False
+
+    def push_handlers(self, handler):
+        self.handlers.append(handler)
+
+    def pop_handlers(self):
+        self.handlers.pop()
+
+    def close(self):
+        self.closed = True
+
+application = import_stubbed('application', {
+    'pyglet': {},
+    'pyglet.gl': {},
+    'pyglet.graphics': {'Batch': object},
+    'pyglet.sprite': {'Sprite': object},
+    'pyglet.text': {'Label': object},
+    'pyglet.text.caret': {'Caret': object},
+    'pyglet.text.document': {'UnformattedDocument': object},
+    'pyglet.text.layout': {'IncrementalTextLayout': object},
+    'pyglet.window': {'Window': FakeWindow, 'key': None},
+})
+
+class Cached(application.Page):
+    cacheable = True
+    built = 0
+
+    def __init__(self, app):
+        super(Cached, self).__init__(app)
+        Cached.built += 1
+        self.resets = 0
+
+    def reset(self):
+        self.resets += 1
+
+class Plain(application.Page):
+    built = 0
+
+    def __init__(self, app):
+        super(Plain, self).__init__(app)
+        Plain.built += 1
+
+class TestPageCache(unittest.TestCase):
+
+    def setUp(self):
+        Cached.built = Plain.built = 0
+        self.app = application.Application(100, 100)
+        self.app.add_pages(Cached, Plain)
+        self.app.set_page_cache(2)
+        self.app.push_page('Plain')
+
+    def test_cacheable_page_is_reused(self):
+        self.app.push_page('Cached')
+        page = self.app.page_stack[-1]
+        self.app.pop_page()
+        self.assertEqual([page], self.app.page_cache)
+
+        self.app.push_page('Cached')
+        self.assertTrue(self.app.page_stack[-1] is page)
+        self.assertEqual(1, Cached.built)
+        self.assertEqual(1, page.resets)
+        self.assertEqual([], self.app.page_cache)
+        self.assertTrue(self.app.handlers[-1] is page)
+
+    def test_other_pages_are_rebuilt(self):
+        self.app.push_page('Plain')
+        page = self.app.page_stack[-1]
+        self.app.pop_page()
+        self.assertEqual([], self.app.page_cache)
+        self.app.push_page('Plain')
+        self.assertFalse(self.app.page_stack[-1] is page)
+        self.assertEqual(3, Plain.built)
+
+    def test_eviction(self):
+        pages = []
+        for i in range(3):
+            self.app.push_page('Cached')
+            pages.append(self.app.page_stack[-1])
+        for i in range(3):
+            self.app.pop_page()
+        # The least recently popped page went first
+        self.assertEqual(pages[1::-1], self.app.page_cache)
+
+        self.app.set_page_cache(1)
+        self.assertEqual([pages[0]], self.app.page_cache)
+        self.app.set_page_cache(0)
+        self.app.push_page('Cached')
+        self.app.pop_page()
+        self.assertEqual([], self.app.page_cache)
+
+    def test_no_cache_by_default(self):
+        app = application.Application(100, 100)
+        app.add_pages(Cached, Plain)
+        app.push_page('Plain')
+        app.push_page('Cached')
+        app.pop_page()
+        app.push_page('Cached')
+        self.assertEqual(2, Cached.built)
+        self.assertEqual(0, app.page_stack[-1].resets)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from assets import *
+from testutil import imports_without
+
+class TestAssets(unittest.TestCase):
+
+    def test_headless(self):
+        self.assertTrue(imports_without('assets', 'pyglet.image'))
+
+    def test_nothing_loaded_up_front(self):
+        assets = Assets()
+        self.assertEqual({}, assets.images)
+        self.assertEqual({}, assets.textures)
+        self.assertTrue(callable(assets.lazy_texture('menu.jpg')))
+
+    def test_paths(self):
+        assets = Assets()
+        self.assertTrue(os.path.isfile(assets.path('menu.jpg')))
+        self.assertRaises(AssetException, assets.path, 'missing.png')
+        self.assertRaises(AssetException, assets.image, 'missing.png')
+
+
+if __name__ == '__main__':
+    unittest.main()
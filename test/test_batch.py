@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import random
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from blockstuff import *
+try:
+    import numpy as np
+    from batch import BatchField
+except ImportError:
+    np = None
+
+def sync_queue(batch, fields):
+    for i, field in enumerate(fields):
+        batch.queue[i] = [BLOCKS.index(block.shape) for block in field.queue]
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestBatchField(unittest.TestCase):
+
+    def assertSameState(self, batch, fields):
+        for i, field in enumerate(fields):
+            self.assertEqual(field.dump.masks,
+                             [int(sum(1 << c for c in np.flatnonzero(row)))
+                              for row in batch.boards[i]])
+            self.assertEqual(field.state, batch.state[i])
+            self.assertEqual(field.points, batch.points[i])
+            self.assertEqual(field.lines, batch.lines[i])
+            self.assertEqual(field.level, batch.level[i])
+            self.assertEqual(field.pieces, batch.pieces[i])
+            if field.state == BlockField.PLAY:
+                block = field.block
+                self.assertEqual(BLOCKS.index(block.shape), batch.shape[i])
+                self.assertEqual(block.rotation, batch.rotation[i])
+                self.assertEqual((block.x, block.y), (batch.x[i], batch.y[i]))
+
+    def run_games(self, w, h, n, steps, seed):
+        rng = random.Random(seed)
+        random.seed(seed)
+        fields = [BlockField(w, h) for i in range(n)]
+        batch = BatchField(n, w, h, seed=seed)
+        for i, field in enumerate(fields):
+            batch.shape[i] = BLOCKS.index(field.block.shape)
+            batch.x[i] = field.block.x
+            batch.y[i] = field.block.y
+
+        for step in range(steps):
+            sync_queue(batch, fields)
+            actions = [rng.randrange(7) for field in fields]
+            for action in range(7):
+                which = np.array([a == action for a in actions])
+                if action == 0:
+                    batch.move(BlockField.LEFT, which)
+                elif action == 1:
+                    batch.move(BlockField.RIGHT, which)
+                elif action == 2:
+                    batch.rotate(BlockField.LEFT, which)
+                elif action == 3:
+                    batch.rotate(BlockField.RIGHT, which)
+                elif action == 4:
+                    batch.fall(which)
+                elif action == 5:
+                    batch.drop(which)
+                else:
+                    batch.update(0.13, which)
+
+            for field, action in zip(fields, actions):
+                if field.state == BlockField.OVER:
+                    continue
+                if action == 0:
+                    field.move(BlockField.LEFT)
+                elif action == 1:
+                    field.move(BlockField.RIGHT)
+                elif action == 2:
+                    field.rotate(BlockField.LEFT)
+                elif action == 3:
+                    field.rotate(BlockField.RIGHT)
+                elif action == 4:
+                    field.fall()
+                elif action == 5:
+                    field.drop()
+                else:
+                    field.update(0.13)
+
+            self.assertSameState(batch, fields)
+        return fields
+
+    def test_matches_block_field(self):
+        self.run_games(10, 20, 8, 400, 1)
+
+    def test_matches_block_field_with_clears(self):
+        fields = self.run_games(4, 12, 8, 400, 2)
+        self.assertTrue(sum(field.lines for field in fields) > 0)
+
+    def test_rotation_at_wall(self):
+        # A J next to the right wall with a filled cell where it would turn
+        field = BlockField(10, 20)
+        block = Block(BLOCKS[1], COLORS[1])
+        block.x = 8
+        block.y = 10
+        field.block = block
+        field.dump[10, 8] = COLORS[0]
+        batch = BatchField(1, 10, 20, seed=4)
+        batch.shape[0] = 1
+        batch.x[0] = 8
+        batch.y[0] = 10
+        batch.boards[0, 10, 8] = 1
+
+        field.rotate(BlockField.RIGHT)
+        batch.rotate(BlockField.RIGHT)
+        self.assertEqual((0, 8), (field.block.rotation, field.block.x))
+        self.assertSameState(batch, [field])
+
+    def test_dump(self):
+        batch = BatchField(2, 4, 4, seed=3)
+        batch.drop()
+        dump = batch.dump(1)
+        self.assertEqual([bool(mask) for mask in dump.masks],
+                         [row.any() for row in batch.boards[1]])
+
+
+if __name__ == '__main__':
+    unittest.main()
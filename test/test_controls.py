@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from controls import *
+
+LEFT = 'left'
+RIGHT = 'right'
+TURN = 'turn'
+
+BINDINGS = {
+    LEFT: ('move left', True),
+    RIGHT: ('move right', True),
+    TURN: ('rotate', False),
+}
+
+class TestControls(unittest.TestCase):
+
+    def setUp(self):
+        self.controls = Controls(BINDINGS, das=100, arr=20,
+                                 clock=lambda: 0.0)
+
+    def test_press_acts_at_once(self):
+        self.controls.press(TURN, 1.0)
+        self.assertEqual([], self.controls.actions(0.5))
+        self.assertEqual([(1.0, 'rotate')], self.controls.actions(1.0))
+        self.assertEqual([], self.controls.actions(5.0))
+
+    def test_auto_repeat(self):
+        self.controls.press(LEFT, 1.0)
+        actions = self.controls.actions(1.15)
+        self.assertEqual([1.0, 1.1, 1.12, 1.14],
+                         [round(t, 3) for t, action in actions])
+        self.controls.release(LEFT, 1.17)
+        self.assertEqual(1, len(self.controls.actions(2.0)))
+
+    def test_repeat_is_independent_of_polling(self):
+        once = Controls(BINDINGS, das=100, arr=20)
+        often = Controls(BINDINGS, das=100, arr=20)
+        for controls in (once, often):
+            controls.press(RIGHT, 0.0)
+            controls.release(RIGHT, 0.5)
+        polled = []
+        for i in range(1, 101):
+            polled.extend(often.actions(i / 100.0))
+        self.assertEqual(once.actions(1.0), polled)
+
+    def test_events_in_order(self):
+        controls = self.controls
+        controls.press(LEFT, 1.0)
+        controls.press(TURN, 1.105)
+        controls.release(LEFT, 1.11)
+        controls.press(RIGHT, 1.12)
+        actions = [action for t, action in controls.actions(1.12)]
+        self.assertEqual(['move left', 'move left', 'rotate', 'move right'],
+                         actions)
+
+    def test_unbound_and_held_keys(self):
+        self.controls.press('other', 1.0)
+        self.controls.press(TURN, 1.0)
+        self.controls.press(TURN, 1.01)
+        self.assertEqual([(1.0, 'rotate')], self.controls.actions(2.0))
+
+    def test_clear(self):
+        self.controls.press(LEFT, 1.0)
+        self.controls.clear()
+        self.assertEqual([], self.controls.actions(2.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
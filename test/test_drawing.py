@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from geom import BlockDump
+from blockstuff import COLORS
+from testutil import import_stubbed
+
+class FakeVertexList(object):
+
+    def __init__(self, count, data):
+        self.count = count
+        self.data = data
+        self.deleted = False
+
+    def delete(self):
+        self.deleted = True
+
+class FakeBatch(object):
+    '''Stands in for pyglet.graphics.Batch, recording what is added.'''
+
+    def __init__(self):
+        self.added = []
+
+    def add(self, count, mode, group, *data):
+        vertex_list = FakeVertexList(count, data)
+        self.added.append(vertex_list)
+        return vertex_list
+
+drawing = import_stubbed('drawing', {
+    'pyglet': {},
+    'pyglet.gl': {'GL_QUADS': 'quads'},
+    'pyglet.graphics': {'Batch': FakeBatch},
+})
+
+class TestDumpRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.dump = BlockDump(4, 6)
+        for row in (1, 2, 3, 5):
+            self.dump[row, 0] = COLORS[0]
+        self.renderer = drawing.DumpRenderer(self.dump)
+        self.batch = self.renderer.batch
+        self.renderer.update()
+
+    def test_builds_filled_rows(self):
+        self.assertEqual(4, len(self.batch.added))
+        self.assertEqual(None, self.renderer.rows[0])
+        self.assertEqual(None, self.renderer.rows[4])
+        # A lone square is its quad and four edges
+        self.assertEqual(5 * 4, self.renderer.rows[5].count)
+        # The shared edges of a column of one colour aren't drawn
+        self.assertEqual(3 * 4, self.renderer.rows[2].count)
+
+    def test_rebuilds_changed_rows_and_neighbours(self):
+        old = list(self.renderer.rows)
+        self.dump[2, 3] = COLORS[1]
+        self.renderer.update()
+
+        self.assertEqual(4 + 3, len(self.batch.added))
+        for row in (1, 2, 3):
+            self.assertTrue(old[row].deleted)
+            self.assertFalse(self.renderer.rows[row] is old[row])
+        self.assertFalse(old[5].deleted)
+        self.assertTrue(self.renderer.rows[5] is old[5])
+
+    def test_unchanged_dump(self):
+        self.renderer.update()
+        self.assertEqual(4, len(self.batch.added))
+
+    def test_emptied_row(self):
+        old = self.renderer.rows[5]
+        self.dump[5, 0] = 0
+        self.renderer.update()
+        self.assertTrue(old.deleted)
+        self.assertEqual(None, self.renderer.rows[5])
+        # Row 4 is rebuilt as a neighbour but has nothing to draw
+        self.assertEqual(4, len(self.batch.added))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from engine import *
+from testutil import imports_without
+
+class TestEngine(unittest.TestCase):
+
+    def test_headless(self):
+        self.assertTrue(imports_without('engine', 'pyglet'))
+
+    def test_step_applies_actions(self):
+        engine = Engine(10, 20)
+        block = engine.field.block
+        x = block.x
+
+        engine.step([MOVE_LEFT, MOVE_LEFT, MOVE_RIGHT])
+        self.assertEqual(x - 1, block.x)
+
+        y = block.y
+        engine.step([FALL])
+        self.assertEqual(y + 1, block.y)
+
+    def test_step_gravity(self):
+        engine = Engine(10, 20)
+        block = engine.field.block
+        y = block.y
+
+        engine.step(dt=0.1)
+        self.assertEqual(y, block.y)
+        engine.step(dt=0.15)
+        self.assertEqual(y + 1, block.y)
+
+        engine.apply(GRAVITY)
+        self.assertEqual(y + 2, block.y)
+
+    def test_gravity_catches_up(self):
+        engine = Engine(10, 20)
+        block = engine.field.block
+        y = block.y
+
+        self.assertEqual(3, engine.update(0.75))
+        self.assertEqual(y + 3, block.y)
+
+    def test_gravity_catch_up_is_capped(self):
+        engine = Engine(10, 20)
+        field = engine.field
+        block = field.block
+        y = block.y
+
+        self.assertEqual(BlockField.MAX_TICKS, engine.update(10.0))
+        self.assertEqual(y + BlockField.MAX_TICKS, block.y)
+        # The backlog is dropped rather than carried into the next update
+        self.assertEqual(0, field.last_update)
+        self.assertEqual(0, engine.update(0.01))
+
+    def test_can_fall(self):
+        engine = Engine(10, 20)
+        field = engine.field
+        self.assertTrue(field.can_fall())
+        field.block.y = 20 - field.block.bounds[1]
+        self.assertFalse(field.can_fall())
+
+    def test_place(self):
+        engine = Engine(10, 20)
+        field = engine.field
+        block = field.block
+
+        self.assertEqual(0, engine.place(0, 1))
+        self.assertNotEqual(block, field.block)
+        self.assertEqual(1, field.pieces)
+        self.assertEqual(block.shape.bounds[1][1],
+                         20 - field.dump.masks.count(0))
+        self.assertEqual(1, field.dump.masks[-1] & 1)
+
+    def test_illegal_place(self):
+        engine = Engine(10, 20)
+        self.assertRaises(EngineException, engine.place, -1, 0)
+        self.assertRaises(EngineException, engine.apply, 99)
+
+    def test_plays_to_the_end(self):
+        engine = Engine(10, 20)
+        while engine.step([DROP]):
+            pass
+        self.assertTrue(engine.is_over())
+        self.assertTrue(engine.field.pieces > 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
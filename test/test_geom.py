@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import random
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from geom import *
+from blockstuff import BLOCKS, COLORS
+
+def slow_features(dump):
+    # The features of a dump computed straight from its squares
+    rows, cols = dump.rows, dump.cols
+    filled = lambda r, c: (c < 0 or c >= cols or r >= rows or
+                           (r >= 0 and dump[r, c] != 0))
+    heights = []
+    holes = column_transitions = wells = 0
+    for c in range(cols):
+        top = rows
+        for r in range(rows - 1, -1, -1):
+            if filled(r, c):
+                top = r
+        heights.append(rows - top)
+        holes += len([r for r in range(top, rows) if not filled(r, c)])
+        column_transitions += len([r for r in range(rows)
+                                   if filled(r - 1, c) != filled(r, c)])
+        column_transitions += int(filled(rows - 1, c) != filled(rows, c))
+        depth = 0
+        for r in range(rows):
+            if not filled(r, c) and filled(r, c - 1) and filled(r, c + 1):
+                depth += 1
+                wells += depth
+            else:
+                depth = 0
+    row_transitions = 0
+    for r in range(rows):
+        row_transitions += len([c for c in range(cols + 1)
+                                if filled(r, c - 1) != filled(r, c)])
+    return {
+        'height': sum(heights),
+        'max_height': max(heights),
+        'holes': holes,
+        'bumpiness': sum(abs(a - b) for a, b in zip(heights, heights[1:])),
+        'row_transitions': row_transitions,
+        'column_transitions': column_transitions,
+        'wells': wells,
+    }
+
+class TestBlockDump(unittest.TestCase):
+
+    def test_masks_follow_cells(self):
+        dump = BlockDump(4, 3)
+
+        dump[1, 0] = COLORS[0]
+        dump[1, 3] = COLORS[1]
+        self.assertEqual(0b1001, dump.masks[1])
+
+        dump[1, 0] = 0
+        self.assertEqual(0b1000, dump.masks[1])
+        self.assertEqual(0, dump.masks[0])
+
+    def test_shape_masks(self):
+        i_block = BLOCKS[0]
+        self.assertEqual((0b1111,), i_block.masks[0])
+        self.assertEqual((1, 1, 1, 1), i_block.masks[1])
+
+    def test_shape_tables(self):
+        t_block = BLOCKS[5]
+        self.assertEqual(((1, 0), (0, 1), (1, 1), (2, 1)), t_block.offsets[0])
+        self.assertEqual((1, 1, 1), t_block.skirts[0])
+        self.assertEqual(((1, 1), (0, 2)), t_block.extents[0])
+        self.assertEqual((3, 2), t_block.bounds[0])
+        self.assertEqual((2, 3), t_block.bounds[1])
+
+    def test_outlines(self):
+        o_block = BLOCKS[6]
+        self.assertEqual(8, len(o_block.outlines[0]))
+        self.assertTrue((0, 0, 1, 0) in o_block.outlines[0])
+        self.assertTrue((2, 0, 2, -1) in o_block.outlines[0])
+        self.assertEqual(10, len(BLOCKS[0].outlines[0]))
+
+    def test_outline_edges(self):
+        # The outline is exactly the square edges that only one square of
+        # the shape has
+        for shape in BLOCKS:
+            for rotation in range(4):
+                edges = {}
+                for x, y in shape.offsets[rotation]:
+                    corners = [(x, -y), (x + 1, -y), (x + 1, -y - 1),
+                               (x, -y - 1)]
+                    for i in range(4):
+                        edge = frozenset((corners[i], corners[i - 1]))
+                        edges[edge] = edges.get(edge, 0) + 1
+                expected = set(edge for edge, n in edges.items() if n == 1)
+                segments = shape.outline(shape.offsets[rotation])
+                self.assertEqual(len(expected), len(segments))
+                self.assertEqual(expected, set(
+                    frozenset(((x1, y1), (x2, y2)))
+                    for x1, y1, x2, y2 in segments))
+
+    def test_block_follows_rotation(self):
+        block = Block(BLOCKS[1], COLORS[1])
+        block.rotate(Block.RIGHT)
+        self.assertEqual(BLOCKS[1].offsets[1], tuple(block))
+        self.assertEqual(BLOCKS[1].bounds[1], block.bounds)
+
+        clone = block.clone()
+        self.assertEqual(block.rotation, clone.rotation)
+        self.assertEqual(block.masks, clone.masks)
+
+    def test_add_block(self):
+        dump = BlockDump(4, 4)
+        block = Block(BLOCKS[0], COLORS[0])
+        block.y = 3
+        dump.add_block(block)
+        self.assertEqual(dump.full_mask, dump.masks[3])
+        self.assertEqual(COLORS[0], dump[3, 2])
+
+        block.y = -1
+        dump.add_block(block)
+        self.assertEqual([0, 0, 0, dump.full_mask], dump.masks)
+
+    def test_collision(self):
+        dump = BlockDump(10, 20)
+        block = Block(BLOCKS[6], COLORS[6])
+
+        block.x = 4
+        block.y = 10
+        self.assertEqual(BlockDump.NO_COL, dump.collision(block))
+
+        dump[11, 5] = COLORS[0]
+        self.assertEqual(BlockDump.BLOCK_COL, dump.collision(block))
+
+        block.x = -1
+        self.assertEqual(BlockDump.SIDE_COL, dump.collision(block))
+
+        block.x = 9
+        self.assertEqual(BlockDump.SIDE_COL, dump.collision(block))
+
+        block.x = 0
+        block.y = 19
+        self.assertEqual(BlockDump.BOTTOM_COL, dump.collision(block))
+
+        block.y = -2
+        self.assertEqual(BlockDump.NO_COL, dump.collision(block))
+
+        # Far off to the side doesn't shift the masks out of all proportion
+        for x in (2**40, -2**40):
+            self.assertEqual(BlockDump.SIDE_COL,
+                             dump.collide(block.shape, 0, x, 10))
+
+    def test_kick_at_wall(self):
+        # A J turned against the right wall overlaps a cell inside the board
+        # as well, so it can't be pushed back off the wall
+        dump = BlockDump(10, 20)
+        dump[10, 8] = COLORS[0]
+        j_block = BLOCKS[1]
+        self.assertEqual(BlockDump.SIDE_COL | BlockDump.BLOCK_COL,
+                         dump.collide(j_block, 1, 8, 10))
+        self.assertEqual(None, dump.kick(j_block, 1, 8, 10))
+
+        dump[10, 8] = 0
+        self.assertEqual((7, 10), dump.kick(j_block, 1, 8, 10))
+
+    def test_remove_filled_lines(self):
+        dump = BlockDump(3, 4)
+        for c in range(3):
+            dump[3, c] = COLORS[0]
+        dump[2, 1] = COLORS[1]
+
+        self.assertEqual(1, dump.remove_filled_lines())
+        self.assertEqual(0b010, dump.masks[3])
+        self.assertEqual(COLORS[1], dump[3, 1])
+        self.assertEqual([0, 0, 0, 0b010], dump.masks)
+
+    def test_clear_lines(self):
+        dump = BlockDump(3, 6)
+        for r in (1, 3, 4):
+            for c in range(3):
+                dump[r, c] = COLORS[0]
+        dump[0, 0] = COLORS[1]
+        dump[2, 1] = COLORS[2]
+        dump[5, 2] = COLORS[3]
+
+        self.assertEqual([1, 3, 4], dump.clear_lines())
+        self.assertEqual([0, 0, 0, 0b001, 0b010, 0b100], dump.masks)
+        self.assertEqual(COLORS[1], dump[3, 0])
+        self.assertEqual(COLORS[2], dump[4, 1])
+        self.assertEqual(COLORS[3], dump[5, 2])
+        self.assertEqual([0] * 9, dump.els[:9])
+        self.assertEqual([], dump.clear_lines())
+
+    def test_remove_line(self):
+        dump = BlockDump(2, 3)
+        dump[0, 0] = COLORS[0]
+        dump[1, 1] = COLORS[1]
+        dump.remove_line(2)
+        self.assertEqual([0, 0b01, 0b10], dump.masks)
+        self.assertEqual(COLORS[1], dump[2, 1])
+
+    def test_copy(self):
+        dump = BlockDump(3, 3)
+        dump[2, 1] = COLORS[0]
+        copy = dump.copy()
+        copy[2, 0] = COLORS[1]
+        self.assertEqual(0b010, dump.masks[2])
+        self.assertEqual(0b011, copy.masks[2])
+        self.assertEqual(0, dump[2, 0])
+
+    def test_row_versions(self):
+        dump = BlockDump(4, 6)
+        block = Block(BLOCKS[6], COLORS[6])
+        block.y = 4
+        dump.add_block(block)
+        self.assertEqual([0, 0, 0, 0, 1, 1], dump.row_versions)
+
+        block.x = 2
+        dump.add_block(block)
+        self.assertEqual(2, dump.version)
+        self.assertEqual([0, 0, 0, 0, 2, 2], dump.row_versions)
+
+        dump[1, 0] = COLORS[0]
+        dump.clear_lines()
+        self.assertEqual([4, 4, 4, 4, 4, 4], dump.row_versions)
+
+    def test_tops(self):
+        dump = BlockDump(3, 6)
+        self.assertEqual([6, 6, 6], dump.tops)
+        dump[4, 0] = COLORS[0]
+        dump[2, 0] = COLORS[0]
+        dump[5, 1] = COLORS[0]
+        self.assertEqual([2, 5, 6], dump.tops)
+        dump[2, 0] = 0
+        self.assertEqual([4, 5, 6], dump.tops)
+
+        block = Block(BLOCKS[6], COLORS[6])
+        block.x = 1
+        block.y = 3
+        dump.add_block(block)
+        self.assertEqual([4, 3, 3], dump.tops)
+
+        self.assertEqual([4], dump.clear_lines())
+        self.assertEqual([6, 4, 4], dump.tops)
+        self.assertEqual([6, 4, 4], dump.copy().tops)
+
+    def test_landing(self):
+        rng = random.Random(7)
+        dump = BlockDump(6, 12)
+        for r in range(4, 12):
+            for c in range(6):
+                if rng.random() < 0.4:
+                    dump[r, c] = COLORS[0]
+        landed = BlockDump.BLOCK_COL | BlockDump.BOTTOM_COL
+        for shape in BLOCKS:
+            for rotation in range(4):
+                w, h = shape.bounds[rotation]
+                for x in range(6 - w + 1):
+                    for y in range(-h, 12 - h + 1):
+                        if dump.collide(shape, rotation, x, y):
+                            continue
+                        expected = y
+                        while not dump.collide(shape, rotation, x,
+                                               expected + 1) & landed:
+                            expected += 1
+                        self.assertEqual(
+                            expected, dump.landing(shape, rotation, x, y))
+
+    def test_features(self):
+        dump = BlockDump(4, 5)
+        self.assertEqual(slow_features(dump), dump.features())
+        for r, c in ((4, 0), (4, 2), (2, 2), (3, 3), (4, 3)):
+            dump[r, c] = COLORS[0]
+        features = dump.features()
+        self.assertEqual(slow_features(dump), features)
+        self.assertEqual(1, features['holes'])
+        self.assertEqual(3, features['max_height'])
+
+    def test_features_follow_changes(self):
+        rng = random.Random(11)
+        dump = BlockDump(6, 10)
+        for i in range(300):
+            choice = rng.random()
+            if choice < 0.5:
+                block = Block(rng.choice(BLOCKS), COLORS[0])
+                block.set_rotation(rng.randrange(4))
+                block.x = rng.randrange(6 - block.bounds[0] + 1)
+                block.y = dump.landing(block.shape, block.rotation,
+                                       block.x, -block.bounds[1])
+                dump.add_block(block)
+            elif choice < 0.8:
+                dump[rng.randrange(10), rng.randrange(6)] = \
+                    rng.choice((0, COLORS[1]))
+            elif choice < 0.9:
+                dump.remove_line(rng.randrange(10))
+            dump.clear_lines()
+            self.assertEqual(slow_features(dump), dump.features())
+            self.assertEqual(slow_features(dump), dump.copy().features())
+
+    def test_replace_rows(self):
+        rng = random.Random(17)
+        dump = BlockDump(6, 10)
+        for i in range(50):
+            rows = []
+            for r in rng.sample(range(10), rng.randrange(4)):
+                rows.append((r, [rng.choice((0, COLORS[2])) for c in range(6)]))
+            version = dump.version
+            dump.replace_rows(rows)
+            for r, values in rows:
+                self.assertEqual(values, dump.els[6 * r:6 * (r + 1)])
+                self.assertTrue(dump.row_versions[r] > version)
+            self.assertEqual(slow_features(dump), dump.features())
+
+    def test_what_if(self):
+        rng = random.Random(13)
+        dump = BlockDump(6, 10)
+        for r in range(5, 10):
+            for c in range(6):
+                if rng.random() < 0.7:
+                    dump[r, c] = COLORS[0]
+        for r in (8, 9):
+            for c in range(1, 6):
+                dump[r, c] = COLORS[0]
+            dump[r, 0] = 0
+        before = dump.features()
+
+        for shape in BLOCKS:
+            for rotation in range(4):
+                w, h = shape.bounds[rotation]
+                for x in range(6 - w + 1):
+                    y = dump.landing(shape, rotation, x, -h)
+                    deltas = dump.what_if(shape, rotation, x, y)
+                    self.assertEqual(before, dump.features())
+
+                    block = Block(shape, COLORS[0])
+                    block.set_rotation(rotation)
+                    block.x = x
+                    block.y = y
+                    after = dump.copy()
+                    after.add_block(block)
+                    self.assertEqual(len(after.clear_lines()),
+                                     deltas.pop('lines'))
+                    after = after.features()
+                    self.assertEqual(
+                        dict((k, after[k] - before[k]) for k in before),
+                        deltas)
+
+
+if __name__ == '__main__':
+    unittest.main()
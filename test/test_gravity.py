@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import random
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from engine import *
+from gravity import *
+
+class TestTimerWheel(unittest.TestCase):
+
+    def test_due_in_order(self):
+        rng = random.Random(0)
+        # Small wheels so that cascading and the overflow get exercised
+        wheel = TimerWheel(bits=2, levels=2)
+        due = {}
+        for key in range(200):
+            due[key] = rng.randrange(1, 100)
+            wheel.schedule(key, due[key])
+        self.assertEqual(200, len(wheel))
+
+        fired = []
+        for tick in range(1, 101, 3):
+            for key in wheel.advance(tick):
+                fired.append(key)
+                self.assertTrue(tick - 3 < due[key] <= tick)
+        self.assertEqual(sorted(due), sorted(fired))
+        self.assertEqual([due[key] for key in fired],
+                         sorted(due[key] for key in fired))
+        self.assertEqual(0, len(wheel))
+
+    def test_cancel_and_reschedule(self):
+        wheel = TimerWheel(bits=2, levels=2)
+        wheel.schedule('a', 5)
+        wheel.schedule('b', 40)
+        wheel.schedule('c', 7)
+        wheel.cancel('c')
+        wheel.schedule('b', 6)
+        self.assertEqual(6, wheel.due('b'))
+        self.assertEqual(['a', 'b'], wheel.advance(50))
+        self.assertEqual(None, wheel.due('c'))
+
+    def test_past_is_next(self):
+        wheel = TimerWheel()
+        wheel.advance(10)
+        wheel.schedule('a', 3)
+        self.assertEqual(11, wheel.due('a'))
+
+class TestGravityScheduler(unittest.TestCase):
+
+    def fields(self, speeds):
+        fields = []
+        for seed, speed in enumerate(speeds):
+            field = BlockField(10, 20, PieceSource(len(BLOCKS), seed))
+            field.speed = speed
+            fields.append(field)
+        return fields
+
+    def test_rates(self):
+        scheduler = GravityScheduler()
+        fields = self.fields((5, 8, 13, 20))
+        counts = dict((field, 0) for field in fields)
+        for field in fields:
+            scheduler.add(field, (lambda f: lambda: counts.update(
+                {f: counts[f] + 1}))(field))
+        for step in range(60):
+            scheduler.advance(1.0 / 60)
+        for field in fields:
+            self.assertTrue(abs(counts[field] - field.speed) <= 1,
+                            (field.speed, counts[field]))
+
+    def test_matches_update(self):
+        scheduler = GravityScheduler()
+        field, other = [BlockField(10, 20, PieceSource(len(BLOCKS), 7))
+                        for i in range(2)]
+        scheduler.add(field)
+        for step in range(1800):
+            scheduler.advance(1.0 / 60)
+            other.update(1.0 / 60)
+            if field.state == BlockField.OVER:
+                break
+        self.assertTrue(abs(field.pieces - other.pieces) <= 1)
+        self.assertTrue(field.pieces > 3)
+
+    def test_reschedule(self):
+        scheduler = GravityScheduler(resolution=0.001)
+        field, = self.fields((5,))
+        scheduler.add(field)
+        scheduler.advance(0.1)
+        self.assertAlmostEqual(0.5, scheduler.progress(field))
+        field.speed = 8
+        scheduler.reschedule(field)
+        y = field.block.y
+        scheduler.advance(0.02)
+        self.assertEqual(y, field.block.y)
+        scheduler.advance(0.01)
+        self.assertEqual(y + 1, field.block.y)
+
+    def test_backlog_is_capped(self):
+        scheduler = GravityScheduler()
+        field, = self.fields((5,))
+        scheduler.add(field)
+        self.assertEqual(BlockField.MAX_TICKS, scheduler.advance(10.0))
+        self.assertEqual(0, scheduler.advance(scheduler.resolution))
+        self.assertEqual(1, scheduler.advance(1.0 / field.speed))
+
+    def test_game_over_removes(self):
+        scheduler = GravityScheduler()
+        field, = self.fields((20,))
+        scheduler.add(field)
+        while field.state == BlockField.PLAY:
+            scheduler.advance(0.25)
+        self.assertFalse(field in scheduler)
+        self.assertEqual(0, len(scheduler.wheel))
+
+    def test_remove_while_ticking(self):
+        scheduler = GravityScheduler()
+        field, other = self.fields((5, 5))
+        scheduler.add(field, lambda: scheduler.remove(field))
+        scheduler.add(other)
+        scheduler.advance(0.3)
+        self.assertFalse(field in scheduler)
+        self.assertTrue(other in scheduler)
+
+
+if __name__ == '__main__':
+    unittest.main()
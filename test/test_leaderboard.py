@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import shutil
+import tempfile
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+import leaderboard
+from leaderboard import Leaderboard
+
+class TestLeaderboard(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'scores.log')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def lines(self):
+        log = open(self.path, 'r')
+        lines = log.readlines()
+        log.close()
+        return lines
+
+    def test_keeps_the_best(self):
+        board = Leaderboard(self.path, size=3, background=False)
+        for score in (5, 1, 7, 3, 7):
+            board.add({'name': str(score), 'score': score})
+        self.assertEqual([7, 7, 5], [e['score'] for e in board.entries()])
+        self.assertEqual(7, board.high_score())
+        self.assertTrue(board.qualifies(6))
+        self.assertFalse(board.qualifies(5))
+        self.assertFalse(board.add({'name': 'late', 'score': 2}))
+
+    def test_persists(self):
+        board = Leaderboard(self.path, size=3)
+        board.add({'name': 'ann', 'score': 10, 'lines': 4, 'level': 1,
+                   'replay': 'game.rpl'})
+        board.add({'name': 'bob', 'score': 10})
+        board.add({'name': 'cid', 'score': 20})
+        board.close()
+
+        entries = Leaderboard(self.path, size=3).entries()
+        self.assertEqual(['cid', 'ann', 'bob'], [e['name'] for e in entries])
+        self.assertEqual('game.rpl', entries[1]['replay'])
+        self.assertTrue(entries[1]['date'])
+
+    def test_lazy_load(self):
+        board = Leaderboard(self.path)
+        self.assertEqual(None, board.heap)
+        self.assertEqual([], board.entries())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_torn_line(self):
+        board = Leaderboard(self.path, background=False)
+        board.add({'name': 'ann', 'score': 10})
+        log = open(self.path, 'a')
+        log.write('{"name": "bob", "sco')
+        log.close()
+
+        board = Leaderboard(self.path, background=False)
+        self.assertEqual(['ann'], [e['name'] for e in board.entries()])
+        board.add({'name': 'cid', 'score': 5})
+        board = Leaderboard(self.path, background=False)
+        self.assertEqual(['ann', 'cid'], [e['name'] for e in board.entries()])
+
+    def test_compaction(self):
+        board = Leaderboard(self.path, size=5)
+        for score in range(1, 400):
+            board.add({'name': '', 'score': score})
+        board.flush()
+        self.assertTrue(len(self.lines()) <= 5 + leaderboard.COMPACT_AFTER)
+        board.close()
+
+        board = Leaderboard(self.path, size=5)
+        self.assertEqual(list(range(399, 394, -1)),
+                         [e['score'] for e in board.entries()])
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+    def test_legacy(self):
+        legacy = os.path.join(self.dir, 'scores.txt')
+        out = open(legacy, 'w')
+        out.write('614')
+        out.close()
+
+        board = Leaderboard(self.path, background=False, legacy=legacy)
+        self.assertEqual(614, board.high_score())
+        board = Leaderboard(self.path, background=False, legacy=legacy)
+        self.assertEqual(1, len(board.entries()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import tempfile
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from pieces import *
+from blockstuff import BlockField, BLOCKS
+
+class TestPieceSource(unittest.TestCase):
+
+    def test_seeded_streams_repeat(self):
+        first = PieceSource(7, seed=5)
+        second = PieceSource(7, seed=5)
+        self.assertEqual([first.next() for i in range(100)],
+                         [second.next() for i in range(100)])
+        self.assertEqual(piece_stream(7, 10, 5), PieceSource(7, 5).peek(10))
+
+    def test_pregenerate(self):
+        source = PieceSource(7, seed=9)
+        pieces = source.pregenerate(200)
+        self.assertEqual(pieces, [source.next() for i in range(200)])
+        self.assertEqual(piece_stream(7, 300, 9)[200:],
+                         [source.next() for i in range(100)])
+
+    def test_bag(self):
+        pieces = piece_stream(7, 70, 1, 'bag')
+        for i in range(0, 70, 7):
+            self.assertEqual(range(7), sorted(pieces[i:i + 7]))
+
+    def test_sequence(self):
+        seq_file = tempfile.NamedTemporaryFile('w', delete=False)
+        seq_file.write('0 1 2\n6\n')
+        seq_file.close()
+        try:
+            pieces = piece_stream(7, 6, 0, 'sequence', path=seq_file.name)
+        finally:
+            os.remove(seq_file.name)
+        self.assertEqual([0, 1, 2, 6, 0, 1], pieces)
+        self.assertRaises(PieceException, PieceSource, 7, 0, 'sequence',
+                          sequence=[7])
+        self.assertRaises(PieceException, PieceSource, 7, 0, 'nope')
+
+    def test_field_queue(self):
+        field = BlockField(10, 20, PieceSource(7, seed=2), queue_len=6)
+        expected = piece_stream(7, 7, 2)
+        self.assertEqual(6, len(field.queue))
+        self.assertEqual(expected[0], BLOCKS.index(field.block.shape))
+        self.assertEqual(expected[1:],
+                         [BLOCKS.index(block.shape) for block in field.queue])
+
+    def test_unseeded_source_keeps_seed(self):
+        source = PieceSource(7)
+        self.assertEqual(piece_stream(7, 20, source.seed),
+                         [source.next() for i in range(20)])
+
+
+if __name__ == '__main__':
+    unittest.main()
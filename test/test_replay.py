@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import io
+import random
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from replay import *
+
+class NamedBytesIO(io.BytesIO):
+    def close(self):
+        self.closed_value = self.getvalue()
+        io.BytesIO.close(self)
+
+def record_game(seed, steps, generator='uniform'):
+    out = NamedBytesIO()
+    engine = Engine(10, 20, seed=seed, generator=generator)
+    engine.recorder = ReplayWriter(out, engine.field)
+    rng = random.Random(seed)
+    for step in range(steps):
+        if engine.is_over():
+            break
+        engine.step([rng.choice(ACTIONS[:6])], dt=rng.random() * 0.1)
+    engine.recorder.close()
+    return engine, io.BytesIO(out.closed_value)
+
+class TestReplay(unittest.TestCase):
+
+    def test_varint(self):
+        for value in (0, 1, 127, 128, 300, 2**32 + 5):
+            buf = bytearray()
+            encode_varint(value, buf)
+            self.assertEqual((value, len(buf)), decode_varint(buf, 0))
+
+    def test_replay_matches(self):
+        for seed in range(5):
+            engine, data = record_game(seed, 2000)
+            replayed, end = play_replay(data)
+            self.assertEqual(engine.field.dump.els, replayed.field.dump.els)
+            self.assertEqual((engine.field.points, engine.field.lines,
+                              engine.field.pieces), end)
+            data.seek(0)
+            self.assertTrue(verify(data))
+
+    def test_generators(self):
+        engine, data = record_game(3, 1000, 'bag')
+        replayed, end = play_replay(data)
+        self.assertEqual('bag', replayed.field.source.generator_name)
+        self.assertEqual(engine.field.dump.els, replayed.field.dump.els)
+        data.seek(0)
+        self.assertTrue(verify(data))
+
+        # A sequence isn't in the header, so it can't be played back
+        source = PieceSource(len(BLOCKS), 3, 'sequence', sequence=[0, 6, 2])
+        field = BlockField(10, 20, source)
+        self.assertRaises(ReplayException, ReplayWriter, NamedBytesIO(), field)
+
+    def test_records(self):
+        engine, data = record_game(4, 50, 'bag')
+        records = list(read_records(data))
+        self.assertEqual((HEADER, 0.0, [4, 10, 20, 4, 'bag']), records[0])
+        self.assertEqual(END, records[-1][0])
+        times = [time for kind, time, fields in records]
+        self.assertEqual(sorted(times), times)
+        self.assertTrue(0 < times[-2] <= engine.time + 0.001)
+
+    def test_place_is_recorded(self):
+        out = NamedBytesIO()
+        engine = Engine(10, 20, seed=1)
+        engine.recorder = ReplayWriter(out, engine.field)
+        for piece in range(5):
+            engine.place(2 * piece, 1)
+        engine.recorder.close()
+        self.assertTrue(verify(io.BytesIO(out.closed_value)))
+
+    def test_tampered_score(self):
+        engine, data = record_game(2, 500)
+        raw = bytearray(data.getvalue())
+        end = len(raw) - 1
+        while raw[end - 1] != END:
+            end -= 1
+        raw[end] += 1
+        self.assertFalse(verify(io.BytesIO(bytes(raw))))
+
+    def test_bad_file(self):
+        records = read_records(io.BytesIO(b'nope'))
+        self.assertRaises(ReplayException, list, records)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import random
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from search import *
+
+def new_engine(shape):
+    engine = Engine(10, 20)
+    field = engine.field
+    field.queue.appendleft(Block(BLOCKS[shape], COLORS[shape]))
+    field.get_new_block()
+    return engine
+
+class TestPlacements(unittest.TestCase):
+
+    def test_empty_board(self):
+        engine = new_engine(5)
+        field = engine.field
+        found = placements(field.dump, field.block)
+        self.assertEqual(34, len(found))
+        for x, y, rotation, path in found:
+            self.assertEqual(20 - BLOCKS[5].bounds[rotation][1], y)
+
+    def test_distinct(self):
+        engine = new_engine(6)
+        field = engine.field
+        self.assertEqual(9, len(placements(field.dump, field.block)))
+        self.assertEqual(36, len(placements(field.dump, field.block,
+                                            distinct=False)))
+
+    def test_paths_lead_to_placement(self):
+        rng = random.Random(3)
+        engine = Engine(10, 20, seed=3)
+        for piece in range(12):
+            engine.place(rng.randrange(7), 0)
+        field = engine.field
+        block = field.block
+
+        for x, y, rotation, path in placements(field.dump, block):
+            test = Engine(field=BlockField(10, 20))
+            test.field.dump = field.dump.copy()
+            test.field.block = block.clone()
+            test.step(path)
+            landed = test.field.block
+            self.assertEqual((x, y, rotation),
+                             (landed.x, landed.y, landed.rotation))
+
+            expected = field.dump.copy()
+            expected.add_block(landed)
+            test.step([DROP])
+            self.assertEqual(test.field.pieces, 1)
+            full = [m for m in expected.masks if m == expected.full_mask]
+            self.assertEqual(len(full), test.field.lines)
+
+    def test_tuck_under_overhang(self):
+        engine = new_engine(0)
+        field = engine.field
+        for c in range(4, 10):
+            field.dump[17, c] = COLORS[0]
+        found = placements(field.dump, field.block)
+        tucked = [p for p in found if p[1] == 19 and p[2] % 2 == 0]
+        self.assertEqual(7, len(tucked))
+
+    def test_blocked_start(self):
+        engine = new_engine(0)
+        field = engine.field
+        field.block.x = -1
+        self.assertEqual([], placements(field.dump, field.block))
+
+
+class TestDrops(unittest.TestCase):
+
+    def test_drops_match_place(self):
+        rng = random.Random(5)
+        engine = Engine(10, 20, seed=5)
+        for piece in range(10):
+            engine.place(rng.randrange(7), 0)
+        field = engine.field
+
+        found = drops(field.dump, field.block, distinct=False)
+        self.assertTrue(found)
+        for x, y, rotation in found:
+            test = Engine(field=BlockField(10, 20))
+            test.field.dump = field.dump.copy()
+            test.field.block = field.block.clone()
+            test.field.block.set_rotation(rotation)
+            test.field.block.x = x
+            self.assertEqual(y, test.field.landing())
+
+    def test_distinct(self):
+        engine = new_engine(6)
+        field = engine.field
+        self.assertEqual(9, len(drops(field.dump, field.block)))
+        self.assertEqual(36, len(drops(field.dump, field.block,
+                                       distinct=False)))
+
+
+if __name__ == '__main__':
+    unittest.main()
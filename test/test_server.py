@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import random
+import shutil
+import socket
+import tempfile
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from server import *
+
+def pump(server, clients, until, rounds=500):
+    for i in range(rounds):
+        server.poll(0.01)
+        for client in clients:
+            client.poll()
+        if until():
+            return True
+    return False
+
+def same(client, session):
+    field, other = client.field, session.engine.field
+    return field is not None and field.dump.els == other.dump.els and \
+        field.points == other.points and field.pieces == other.pieces and \
+        (field.block.x, field.block.y, field.block.rotation) == \
+        (other.block.x, other.block.y, other.block.rotation)
+
+class TestServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = GameServer(('127.0.0.1', 0), seed=3)
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.server.close()
+
+    def connect(self, address=None):
+        client = RemoteField(address or self.server.address)
+        self.clients.append(client)
+        self.assertTrue(pump(self.server, [client],
+                             lambda: client.field is not None))
+        return client
+
+    def session(self):
+        self.assertEqual(1, len(self.server.sessions))
+        return list(self.server.sessions)[0]
+
+    def test_mirrors_the_server(self):
+        client = self.connect()
+        session = self.session()
+        rng = random.Random(1)
+        for i in range(300):
+            if client.is_over():
+                break
+            client.send(rng.choice(CLIENT_ACTIONS[:6]))
+            self.server.update(rng.random() * 0.2)
+            pump(self.server, [client], lambda: same(client, session), 50)
+        self.assertTrue(client.field.pieces > 0)
+        if not client.is_over():
+            self.assertTrue(same(client, session))
+
+    def test_place(self):
+        client = self.connect()
+        session = self.session()
+        client.place(0, 1)
+        self.assertTrue(pump(self.server, [client],
+                             lambda: client.field.pieces == 1))
+        self.assertTrue(same(client, session))
+        self.assertEqual(1, session.engine.field.pieces)
+
+    def test_game_over(self):
+        client = self.connect()
+        session = self.session()
+        for i in range(100):
+            client.send(DROP)
+        self.assertTrue(pump(self.server, [client], lambda: client.closed))
+        field = session.engine.field
+        self.assertEqual((field.points, field.lines, field.pieces), client.end)
+        self.assertTrue(client.field.state == BlockField.OVER)
+        self.assertEqual(0, len(self.server.sessions))
+        self.assertEqual(0, len(self.server.scheduler))
+
+    def test_gravity(self):
+        client = self.connect()
+        session = self.session()
+        y = session.engine.field.block.y
+        self.server.update(1.0 / session.engine.field.speed + 0.01)
+        self.assertEqual(y + 1, session.engine.field.block.y)
+        self.assertTrue(pump(self.server, [client],
+                             lambda: client.field.block.y == y + 1))
+        self.assertTrue(same(client, session))
+
+    def test_rejects_gravity(self):
+        client = self.connect()
+        client.send(GRAVITY)
+        self.assertTrue(pump(self.server, [client], lambda: client.closed))
+        self.assertEqual(0, len(self.server.sessions))
+
+    def test_rejects_bad_place(self):
+        for x, rotation in ((2**34, 0), (0, 4), (10, 0)):
+            client = self.connect()
+            client.place(x, rotation)
+            self.assertTrue(pump(self.server, [client], lambda: client.closed))
+            self.assertEqual(0, len(self.server.sessions))
+
+    def test_ignores_unreachable_place(self):
+        client = self.connect()
+        session = self.session()
+        field = session.engine.field
+        # A wall the block can't get past to the left of it
+        for r in range(field.h):
+            field.dump[r, 2] = COLORS[0]
+        field.block.y = 5
+        x = field.block.x
+        self.assertFalse(session.reachable(0, 0))
+        self.assertTrue(session.reachable(x, field.block.rotation))
+
+        client.place(0, 0)
+        client.send(MOVE_RIGHT)
+        self.assertTrue(pump(self.server, [client],
+                             lambda: field.block.x == x + 1))
+        self.assertEqual(0, field.pieces)
+        self.assertEqual(1, len(self.server.sessions))
+
+    def test_rejects_long_record(self):
+        client = self.connect()
+        # The length of a 2**40 byte record, and then some of it
+        client.sock.sendall(b'\x80\x80\x80\x80\x80\x20' + b'\x00' * 4096)
+        self.assertTrue(pump(self.server, [client], lambda: client.closed))
+        self.assertEqual(0, len(self.server.sessions))
+
+    def test_many_sessions(self):
+        clients = [self.connect() for i in range(20)]
+        self.assertEqual(20, len(self.server.sessions))
+        seeds = set(session.engine.field.source.seed
+                    for session in self.server.sessions)
+        self.assertEqual(20, len(seeds))
+        for client in clients:
+            client.send(DROP)
+        self.assertTrue(pump(self.server, clients,
+            lambda: all(client.field.pieces == 1 for client in clients)))
+
+    @unittest.skipUnless(hasattr(socket, 'AF_UNIX'), 'no Unix sockets')
+    def test_unix_socket(self):
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'server.sock')
+            server = GameServer(path)
+            client = RemoteField(path)
+            try:
+                self.assertTrue(pump(server, [client],
+                                     lambda: client.field is not None))
+                client.send(DROP)
+                self.assertTrue(pump(server, [client],
+                                     lambda: client.field.pieces == 1))
+            finally:
+                client.close()
+                server.close()
+            self.assertFalse(os.path.exists(path))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_parse_address(self):
+        self.assertEqual(('localhost', 7777), parse_address('localhost:7777'))
+        self.assertEqual('/tmp/game.sock', parse_address('/tmp/game.sock'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import random
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from engine import *
+from stream import *
+
+def play(seed, steps):
+    '''Yields the field of a random game after every action.'''
+    engine = Engine(10, 20, seed=seed)
+    rng = random.Random(seed)
+    for step in range(steps):
+        if engine.is_over():
+            break
+        engine.apply(rng.choice(ACTIONS))
+        yield engine.field
+
+class TestStream(unittest.TestCase):
+
+    def assertSameField(self, field, other):
+        self.assertEqual(field.dump.els, other.dump.els)
+        self.assertEqual(field.dump.masks, other.dump.masks)
+        self.assertEqual(field.dump.columns, other.dump.columns)
+        self.assertEqual(field.dump.tops, other.dump.tops)
+        block, other_block = field.block, other.block
+        self.assertTrue(block.shape is other_block.shape)
+        self.assertEqual((block.color, block.rotation, block.x, block.y),
+                         (other_block.color, other_block.rotation,
+                          other_block.x, other_block.y))
+        self.assertEqual([b.shape for b in field.queue],
+                         [b.shape for b in other.queue])
+        for name in ('points', 'lines', 'level', 'next_level', 'pieces',
+                     'speed', 'state'):
+            self.assertEqual(getattr(field, name), getattr(other, name))
+        self.assertEqual(field.landing(), other.landing())
+
+    def test_round_trip(self):
+        for seed in range(3):
+            encoder = None
+            decoder = FieldDecoder()
+            for field in play(seed, 3000):
+                if encoder is None:
+                    encoder = FieldEncoder(field, keyframe_interval=50)
+                self.assertTrue(decoder.decode(encoder.frame()))
+                self.assertSameField(field, decoder.field)
+            self.assertTrue(field.lines > 0 or field.state == field.OVER)
+
+    def test_sizes(self):
+        engine = Engine(10, 20, seed=1)
+        encoder = FieldEncoder(engine.field)
+        keyframe = encoder.frame()
+        self.assertTrue(len(keyframe) < 20 * 5 + 30)
+        engine.apply(MOVE_LEFT)
+        self.assertTrue(len(encoder.frame()) <= 8)
+        self.assertEqual(3, len(encoder.frame()))
+        engine.apply(DROP)
+        frame = encoder.frame()
+        # The block's rows, the new block, the queue and the score
+        self.assertTrue(len(frame) < 40, len(frame))
+
+        total = 0
+        frames = 0
+        for field in play(2, 2000):
+            total += len(encoder.frame())
+            frames += 1
+        self.assertTrue(total / frames < 16, total / frames)
+
+    def test_join_and_loss(self):
+        fields = play(4, 1000)
+        field = next(fields)
+        encoder = FieldEncoder(field, keyframe_interval=10)
+        decoder = FieldDecoder()
+        encoder.frame()
+        self.assertFalse(decoder.decode(encoder.frame()))
+        self.assertEqual(None, decoder.field)
+
+        applied = []
+        for i, field in enumerate(fields):
+            frame = encoder.frame()
+            if i == 30:
+                # Lost
+                continue
+            applied.append(decoder.decode(frame))
+            if applied[-1]:
+                self.assertSameField(field, decoder.field)
+            if i == 60:
+                break
+        # Joins at the keyframe at seq 10 and, after losing seq 32, picks up
+        # again at seq 40
+        self.assertEqual([False] * 8 + [True] * 22 + [False] * 7 +
+                         [True] * 23, applied)
+
+    def test_request_keyframe(self):
+        field = Engine(10, 20, seed=5).field
+        encoder = FieldEncoder(field)
+        self.assertEqual(KEYFRAME, bytearray(encoder.frame())[0])
+        self.assertEqual(DELTA, bytearray(encoder.frame())[0])
+        encoder.request_keyframe()
+        self.assertEqual(KEYFRAME, bytearray(encoder.frame())[0])
+
+    def test_malformed(self):
+        field = Engine(10, 20, seed=6).field
+        encoder = FieldEncoder(field)
+        keyframe = encoder.frame()
+        decoder = FieldDecoder()
+        self.assertRaises(StreamException, decoder.decode, b'')
+        self.assertRaises(StreamException, decoder.decode, b'\x09\x00')
+        self.assertRaises(StreamException, decoder.decode, keyframe[:-3])
+        self.assertRaises(StreamException, decoder.decode, keyframe + b'\x00')
+
+        field.dump[19, 0] = (0.1, 0.2, 0.3)
+        self.assertRaises(StreamException, encoder.frame)
+
+    def test_zigzag(self):
+        for value in (0, 1, -1, 2, -2, 63, -64, 1000):
+            self.assertEqual(value, unzigzag(zigzag(value)))
+            self.assertTrue(zigzag(value) >= 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import json
+import tempfile
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+import timing
+
+@timing.timed('test.double')
+def double(x):
+    return 2 * x
+
+class TestTiming(unittest.TestCase):
+
+    def setUp(self):
+        timing.reset()
+
+    def tearDown(self):
+        timing.enable(False)
+        timing.reset()
+
+    def test_disabled_records_nothing(self):
+        self.assertEqual(4, double(2))
+        self.assertEqual([], timing.report())
+
+    def test_enabled_records(self):
+        timing.enable()
+        for i in range(10):
+            double(i)
+        rows = timing.report()
+        self.assertEqual(1, len(rows))
+        self.assertEqual('test.double', rows[0]['name'])
+        self.assertEqual(10, rows[0]['count'])
+        self.assertTrue(rows[0]['p50'] <= rows[0]['p99'] <= rows[0]['max'])
+
+    def test_percentiles(self):
+        hist = timing.Histogram(window=100)
+        for i in range(200):
+            hist.add(i)
+        self.assertEqual([100, 150, 199], hist.percentiles(0, 50, 100))
+        self.assertEqual(200, hist.count)
+        self.assertEqual(199, hist.max)
+
+    def test_dump(self):
+        for i in range(5):
+            timing.record('test.dump', i / 1000.0)
+        directory = tempfile.mkdtemp()
+        csv_path = os.path.join(directory, 'stats.csv')
+        jsonl_path = os.path.join(directory, 'stats.jsonl')
+        timing.dump(csv_path)
+        timing.dump(jsonl_path)
+
+        lines = open(csv_path).read().splitlines()
+        self.assertEqual(','.join(timing.COLUMNS), lines[0])
+        self.assertTrue(lines[1].startswith('test.dump,5,'))
+        row = json.loads(open(jsonl_path).readline())
+        self.assertEqual(5, len(row['samples']))
+
+        os.remove(csv_path)
+        os.remove(jsonl_path)
+        os.rmdir(directory)
+
+    def test_since_start(self):
+        started = timing.STARTED
+        try:
+            timing.mark_start()
+            self.assertTrue(timing.STARTED >= started)
+            self.assertTrue(0 <= timing.since_start() < 1)
+        finally:
+            timing.STARTED = started
+
+
+if __name__ == '__main__':
+    unittest.main()
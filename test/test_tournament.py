@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+#-*- coding: utf-8 -*-
+
+import unittest
+import sys, os
+sys.path.insert(0, os.path.abspath(__file__ + "/../.."))
+
+from tournament import *
+
+def left_bot(field):
+    return 0, 0
+
+class TestTournament(unittest.TestCase):
+
+    def test_play_game(self):
+        result = play_game(left_bot, 1)
+        self.assertEqual(1, result['seed'])
+        self.assertTrue(result['pieces'] > 0)
+        self.assertEqual(play_game(left_bot, 1)['pieces'], result['pieces'])
+
+    def test_forfeit(self):
+        result = play_game(lambda field: (-1, 0), 1)
+        self.assertTrue(result['forfeit'])
+        self.assertEqual(0, result['pieces'])
+
+    def test_max_pieces(self):
+        result = play_game(left_bot, 1, w=20, max_pieces=3)
+        self.assertEqual(3, result['pieces'])
+
+    def test_run_tournament(self):
+        seen = []
+        results = run_tournament(left_bot, range(6), processes=2,
+                                 callback=lambda r, rs: seen.append(r['seed']))
+        self.assertEqual(range(6), sorted(seen))
+        summary = results.summary()
+        self.assertEqual(6, summary['games'])
+        self.assertTrue(summary['mean_pieces'] > 0)
+        self.assertTrue(summary['best'] >= summary['worst'])
+
+
+if __name__ == '__main__':
+    unittest.main()
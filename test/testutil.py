@@ -0,0 +1,42 @@
+import subprocess
+import types
+import sys, os
+
+ROOT = os.path.abspath(os.path.dirname(__file__) + "/..")
+
+def import_stubbed(name, stubs):
+    '''Imports the module name with the modules in stubs replaced by empty
+    ones, for modules such as pyglet.gl that need a display. stubs maps
+    module names to dictionaries of the attributes to give them. sys.modules
+    is put back afterwards, so other tests see the real modules, if any.
+    '''
+    names = list(stubs) + [name]
+    saved = dict((module, sys.modules.get(module)) for module in names)
+    try:
+        modules = {}
+        for module, attrs in stubs.items():
+            modules[module] = types.ModuleType(module)
+            modules[module].__dict__.update(attrs)
+        for module in stubs:
+            if '.' in module:
+                parent, child = module.rsplit('.', 1)
+                if parent in modules:
+                    setattr(modules[parent], child, modules[module])
+        sys.modules.update(modules)
+        sys.modules.pop(name, None)
+        return __import__(name)
+    finally:
+        for module, saved_module in saved.items():
+            if saved_module is None:
+                sys.modules.pop(module, None)
+            else:
+                sys.modules[module] = saved_module
+
+def imports_without(name, unwanted):
+    '''Returns True if importing the module name in a fresh interpreter
+    leaves unwanted out of sys.modules. The test process can't tell, since
+    other tests may have imported it already.
+    '''
+    code = 'import {0}, sys; assert {1!r} not in sys.modules'.format(
+        name, unwanted)
+    return subprocess.call([sys.executable, '-c', code], cwd=ROOT) == 0
@@ -0,0 +1,126 @@
+import atexit
+import functools
+import json
+import timeit
+from collections import deque
+
+# time.time on Linux under Python 2, so this is wall time, not monotonic;
+# its resolution is what process start times lacked
+clock = timeit.default_timer
+
+WINDOW = 1000
+
+ENABLED = False
+STATS = {}
+
+# When the program started by clock, the import of this module unless
+# mark_start says otherwise
+STARTED = clock()
+
+class Histogram(object):
+    '''Keeps the last WINDOW samples of a timer, in seconds, along with a
+    running count and total over all samples.
+    '''
+
+    def __init__(self, window=WINDOW):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentiles(self, *ps):
+        '''Returns the given percentiles of the recent samples.'''
+        samples = sorted(self.samples)
+        if not samples:
+            return [0.0] * len(ps)
+        last = len(samples) - 1
+        return [samples[int(round(p / 100.0 * last))] for p in ps]
+
+def enable(flag=True):
+    global ENABLED
+    ENABLED = flag
+
+def reset():
+    STATS.clear()
+
+def record(name, seconds):
+    hist = STATS.get(name)
+    if hist is None:
+        hist = STATS[name] = Histogram()
+    hist.add(seconds)
+
+def timed(name):
+    '''Decorator that records the run time of every call under name while
+    timing is enabled. When it's disabled the only cost is one extra call
+    and a flag check.
+    '''
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, clock() - start)
+        return wrapper
+    return decorate
+
+def mark_start():
+    '''Marks now as the start of the program, for since_start. main calls
+    it before anything slow is imported.
+    '''
+    global STARTED
+    STARTED = clock()
+
+def since_start():
+    return clock() - STARTED
+
+def report():
+    '''Returns one dictionary per timer, sorted by name, with times in
+    milliseconds.
+    '''
+    rows = []
+    for name in sorted(STATS):
+        hist = STATS[name]
+        p50, p95, p99 = hist.percentiles(50, 95, 99)
+        rows.append({
+            'name': name,
+            'count': hist.count,
+            'mean': 1000.0 * hist.total / hist.count,
+            'p50': 1000.0 * p50,
+            'p95': 1000.0 * p95,
+            'p99': 1000.0 * p99,
+            'max': 1000.0 * hist.max,
+        })
+    return rows
+
+COLUMNS = ('name', 'count', 'mean', 'p50', 'p95', 'p99', 'max')
+
+def dump(path):
+    '''Writes the report to path, as JSON lines if the name ends in .jsonl
+    and as CSV otherwise. Individual samples are also written in JSON lines.
+    '''
+    out = open(path, 'w')
+    try:
+        if path.endswith('.jsonl'):
+            for row in report():
+                row['samples'] = list(STATS[row['name']].samples)
+                out.write(json.dumps(row) + '\n')
+        else:
+            out.write(','.join(COLUMNS) + '\n')
+            for row in report():
+                out.write(','.join(str(row[key]) for key in COLUMNS) + '\n')
+    finally:
+        out.close()
+
+def dump_at_exit(path):
+    atexit.register(dump, path)
@@ -0,0 +1,128 @@
+import importlib
+import multiprocessing
+import sys
+import time
+
+from engine import *
+
+def play_game(bot, seed, w=10, h=20, max_pieces=None, generator='uniform'):
+    '''Plays a single game with bot, a callable that is given the BlockField
+    and returns the (x, rotation) to place the current block at. Returns a
+    dictionary describing the finished game. A bot that asks for an illegal
+    placement forfeits the rest of the game. The pieces are dealt by the
+    named pieces generator seeded with seed, so every game is reproducible.
+    '''
+    start = time.time()
+    engine = Engine(w, h, seed=seed, generator=generator)
+    field = engine.field
+    forfeit = False
+    while not engine.is_over():
+        if max_pieces is not None and field.pieces >= max_pieces:
+            break
+        x, rotation = bot(field)
+        try:
+            engine.place(x, rotation)
+        except EngineException:
+            forfeit = True
+            break
+
+    return {
+        'seed': seed,
+        'points': field.points,
+        'lines': field.lines,
+        'level': field.level,
+        'pieces': field.pieces,
+        'time': time.time() - start,
+        'forfeit': forfeit,
+    }
+
+def play_job(job):
+    bot, seed, options = job
+    return play_game(bot, seed, **options)
+
+def run_games(bot, seeds, processes=None, **options):
+    '''Plays a game for every seed on a pool of processes and yields the
+    results in the order the games finish. bot has to be picklable, i.e. a
+    module level function or an instance of a module level class.
+    '''
+    pool = multiprocessing.Pool(processes)
+    try:
+        jobs = [(bot, seed, options) for seed in seeds]
+        for result in pool.imap_unordered(play_job, jobs):
+            yield result
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+class Results(object):
+    '''Aggregates game results as they come in.'''
+
+    KEYS = ('points', 'lines', 'level', 'pieces', 'time')
+
+    def __init__(self):
+        self.games = []
+        self.totals = dict((key, 0) for key in self.KEYS)
+        self.best = None
+        self.worst = None
+        self.forfeits = 0
+
+    def add(self, result):
+        self.games.append(result)
+        for key in self.KEYS:
+            self.totals[key] += result[key]
+        if result['forfeit']:
+            self.forfeits += 1
+        if self.best is None or result['points'] > self.best['points']:
+            self.best = result
+        if self.worst is None or result['points'] < self.worst['points']:
+            self.worst = result
+
+    def mean(self, key):
+        if not self.games:
+            return 0.0
+        return float(self.totals[key]) / len(self.games)
+
+    def summary(self):
+        summary = dict(('mean_' + key, self.mean(key)) for key in self.KEYS)
+        summary['games'] = len(self.games)
+        summary['forfeits'] = self.forfeits
+        if self.games:
+            summary['best'] = self.best['points']
+            summary['worst'] = self.worst['points']
+        return summary
+
+def run_tournament(bot, seeds, processes=None, callback=None, **options):
+    '''Plays every seed with bot across a process pool. callback, if given,
+    is called with each game result and the running Results as games finish.
+    '''
+    results = Results()
+    for result in run_games(bot, seeds, processes, **options):
+        results.add(result)
+        if callback:
+            callback(result, results)
+    return results
+
+def load_bot(spec):
+    '''Loads a bot from a "module:name" string.'''
+    module, name = spec.split(':')
+    return getattr(importlib.import_module(module), name)
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        sys.exit('usage: tournament.py module:bot games [first_seed]')
+    bot = load_bot(sys.argv[1])
+    first = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    seeds = range(first, first + int(sys.argv[2]))
+
+    def report(result, results):
+        sys.stdout.write('seed {seed}: {points} points, {lines} lines, '
+                         '{pieces} pieces in {time:.2f}s\n'.format(**result))
+        if result['forfeit']:
+            sys.stdout.write('seed {seed}: illegal placement\n'.format(**result))
+
+    results = run_tournament(bot, seeds, callback=report)
+    for key, value in sorted(results.summary().items()):
+        sys.stdout.write('{0}: {1}\n'.format(key, value))